@@ -1,59 +1,162 @@
 from flask import Flask
 from flask_cors import CORS
 from routes import chromecast_routes
-import queue
-import threading
+import os
+import time
 import logging
+import threading
 from services import chromecast_service
+from services.dispatcher import Dispatcher, QueueFull
+from services.job_status import job_registry, CONNECTING, FINISHED, FAILED, TERMINAL
+from services.presence_service import presence_tracker, PRESENCE_ENABLED
+from services.device_registry import device_registry
+from models.database import Session
+import atexit
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# 1. Create a thread-safe queue
-job_queue = queue.Queue()
-
-def worker():
-    """Processes tasks from the job_queue."""
-    while True:
-        try:
-            job = job_queue.get()  # This blocks until a job is available
-            logging.info(f"Got job: {job}")
-            
-            action_type = job.get("action_type")
-            
-            if action_type == "YOUTUBE":
-                chromecast_service.play_youtube_audio(
-                    device_name=job["device_name"],
-                    device_ip=job["device_ip"],
-                    youtube_url=job["youtube_url"],
-                    duration=job["duration"]
-                )
-            elif action_type == "TTS":
-                chromecast_service.play_media_url(
-                    device_name=job["device_name"],
-                    device_ip=job["device_ip"],
-                    media_url=job["media_url"],
-                    content_type=job.get("content_type", "audio/mp3")
-                )
-            else:
-                logging.error(f"Unknown action type: {action_type}")
-
-            job_queue.task_done()
-        except Exception as e:
-            logging.error(f"Error processing job {job}: {e}")
-            # In case of error, still mark task as done to avoid blocking
-            job_queue.task_done()
-
-
-# 2. Start the worker thread
-threading.Thread(target=worker, daemon=True).start()
-logging.info("Chromecast worker thread started.")
+# Longest a job is held back by more important playback on its device.
+PREEMPT_MAX_HOLD_SECONDS = float(os.getenv("PREEMPT_MAX_HOLD_SECONDS", 600))
+# Longest interrupted media waits for the interrupting job to end.
+PREEMPT_RESUME_MAX_WAIT = float(os.getenv("PREEMPT_RESUME_MAX_WAIT", 3600))
+
+PLAYBACK_ACTIONS = ("YOUTUBE", "TTS", "QUEUE", "RESUME", "BROADCAST")
+
+
+def can_start(job):
+    """Holds a playback job while its device plays something more important."""
+    if job.get("action_type") not in PLAYBACK_ACTIONS:
+        return True
+    playing = job_registry.playing_priority(dispatcher.lane_key(job))
+    if playing is None or playing <= job.get("priority", 0):
+        job.pop("held_since", None)
+        return True
+    held_since = job.setdefault("held_since", time.monotonic())
+    return time.monotonic() - held_since >= PREEMPT_MAX_HOLD_SECONDS
+
+
+def resume_after(job_id, job, snapshot, priority):
+    """Queues the interrupted media again once the interrupting job ends."""
+    deadline = time.monotonic() + PREEMPT_RESUME_MAX_WAIT
+    record = job_registry.get(job_id)
+    while record and record["status"] not in TERMINAL and time.monotonic() < deadline:
+        record = job_registry.wait(job_id, 60)
+    if not record or record["status"] not in TERMINAL:
+        return
+
+    resume = {
+        "action_type": "RESUME",
+        "device_name": job["device_name"],
+        "device_ip": job["device_ip"],
+        "media_url": snapshot["content_id"],
+        "content_type": snapshot["content_type"],
+        "current_time": snapshot["current_time"],
+        "stop_in": snapshot["stop_in"],
+        "priority": priority,
+    }
+    resume["job_id"] = job_registry.create(resume)["jobId"]
+    try:
+        dispatcher.put(resume)
+    except QueueFull as e:
+        job_registry.update(resume["job_id"], FAILED, error=str(e))
+
+
+def run_job(job):
+    """Executes one job on its device lane and returns the service result."""
+    action_type = job.get("action_type")
+    job_id = job.get("job_id")
+    job_registry.update(job_id, CONNECTING)
+
+    # Remember what this job interrupts, if it is to be resumed afterwards.
+    snapshot = interrupted_priority = None
+    if job.get("resume") and action_type in PLAYBACK_ACTIONS:
+        interrupted_priority = job_registry.playing_priority(dispatcher.lane_key(job))
+        if interrupted_priority is not None and interrupted_priority < job.get("priority", 0):
+            snapshot = chromecast_service.media_snapshot(job["device_name"], job["device_ip"])
+
+    if action_type == "YOUTUBE":
+        result = chromecast_service.play_youtube_audio(
+            device_name=job["device_name"],
+            device_ip=job["device_ip"],
+            youtube_url=job["youtube_url"],
+            duration=job["duration"],
+            job_id=job_id
+        )
+    elif action_type == "TTS":
+        result = chromecast_service.play_media_url(
+            device_name=job["device_name"],
+            device_ip=job["device_ip"],
+            media_url=job["media_url"],
+            content_type=job.get("content_type", "audio/mp3"),
+            job_id=job_id
+        )
+    elif action_type == "QUEUE":
+        result = chromecast_service.queue_media_urls(
+            device_name=job["device_name"],
+            device_ip=job["device_ip"],
+            media_urls=job["media_urls"],
+            content_type=job.get("content_type", "audio/mp3"),
+            job_id=job_id
+        )
+    elif action_type == "RESUME":
+        result = chromecast_service.resume_media(
+            device_name=job["device_name"],
+            device_ip=job["device_ip"],
+            content_id=job["media_url"],
+            content_type=job["content_type"],
+            current_time=job["current_time"],
+            stop_in=job.get("stop_in"),
+            job_id=job_id
+        )
+    elif action_type == "PREPARE":
+        result = chromecast_service.prepare_device(
+            device_name=job["device_name"],
+            device_ip=job["device_ip"],
+            youtube_url=job.get("youtube_url")
+        )
+        if result["status"] == "success":
+            job_registry.update(job_id, FINISHED)
+    else:
+        logging.error(f"Unknown action type: {action_type}")
+        result = {"status": "error", "message": f"Unknown action type: {action_type}"}
+
+    if result["status"] == "error":
+        job_registry.update(job_id, FAILED, error=result["message"])
+    elif snapshot:
+        threading.Thread(target=resume_after, args=(job_id, job, snapshot, interrupted_priority),
+                         name="resume", daemon=True).start()
+    return result
+
+
+# 1. One priority lane per device, devices played in parallel
+dispatcher = Dispatcher(run_job, can_start)
+logging.info(f"Chromecast dispatcher started with {dispatcher.max_concurrency} lanes in parallel.")
+
+# 2. Keep the registered devices in memory
+try:
+    device_registry.load()
+except Exception as e:
+    # The registry loads itself on first use once the database is up.
+    logging.error(f"Failed to load the device registry: {e}")
+
+# 3. Track which devices are reachable in the background
+if PRESENCE_ENABLED:
+    presence_tracker.start()
+    atexit.register(presence_tracker.shutdown)
 
 app = Flask(__name__)
 CORS(app)
 
-# 3. Make the queue available to the routes
-app.config['JOB_QUEUE'] = job_queue
+# 4. Make the dispatcher available to the routes
+app.config['JOB_QUEUE'] = dispatcher
+
+
+@app.teardown_appcontext
+def release_session(exception=None):
+    # Return the request thread's database connection to the pool.
+    Session.remove()
+
 
 app.register_blueprint(chromecast_routes.bp)
 
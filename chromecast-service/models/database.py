@@ -0,0 +1,71 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+from contextlib import contextmanager
+import threading
+import os
+
+# --- Database Setup (for device management only) ---
+database_host = os.getenv('DATABASE_HOST', '127.0.0.1')
+database_port = os.getenv('DATABASE_PORT', '5432')
+database_user = os.getenv('DATABASE_USER', 'user')
+database_password = os.getenv('DATABASE_PASSWORD', 'password')
+database_name = os.getenv('DATABASE_NAME', 'vtlr')
+
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 5))
+DATABASE_POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT', 10))
+DATABASE_POOL_RECYCLE = int(os.getenv('DATABASE_POOL_RECYCLE', 1800))
+
+DATABASE_URL = f"postgresql://{database_user}:{database_password}@{database_host}:{database_port}/{database_name}"
+engine = create_engine(DATABASE_URL,
+                       pool_size=DATABASE_POOL_SIZE,
+                       max_overflow=DATABASE_MAX_OVERFLOW,
+                       pool_timeout=DATABASE_POOL_TIMEOUT,
+                       pool_recycle=DATABASE_POOL_RECYCLE,
+                       pool_pre_ping=True)
+
+# One session per thread; Session.remove() hands its connection back.
+Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+
+_pool_counters = {"connects": 0, "checkouts": 0, "checkins": 0}
+_pool_lock = threading.Lock()
+
+
+def _count(name):
+  def listener(*args):
+    with _pool_lock:
+      _pool_counters[name] += 1
+  return listener
+
+
+event.listen(engine, "connect", _count("connects"))
+event.listen(engine, "checkout", _count("checkouts"))
+event.listen(engine, "checkin", _count("checkins"))
+
+
+@contextmanager
+def session_scope():
+  """Yields the thread's session, commits on success, and always releases it."""
+  session = Session()
+  try:
+    yield session
+    session.commit()
+  except Exception:
+    session.rollback()
+    raise
+  finally:
+    Session.remove()
+
+
+def pool_stats():
+  pool = engine.pool
+  with _pool_lock:
+    counters = dict(_pool_counters)
+  return {
+      "size": pool.size(),
+      "maxOverflow": DATABASE_MAX_OVERFLOW,
+      "checkedOut": pool.checkedout(),
+      "checkedIn": pool.checkedin(),
+      "overflow": pool.overflow(),
+      **counters,
+  }
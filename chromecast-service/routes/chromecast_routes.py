@@ -1,25 +1,69 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, send_file
 from models.users_device import UserDevices
+from models.database import session_scope, pool_stats
 from services.chromecast_service import findDevice
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
+from services.media_cache import media_cache
+from services.device_pool import device_pool
+from services.presence_service import presence_tracker
+from services.device_registry import device_registry
+from services.job_status import job_registry, FAILED
+from services.youtube_cache import youtube_cache
+from services.broadcast import broadcast, BROADCAST_MAX_DEVICES
+from services.dispatcher import QueueFull, PRIORITIES
+from services.stop_scheduler import stop_scheduler
 import logging
 from datetime import datetime
 
 bp = Blueprint('chromecast', __name__, url_prefix='/v1.0/chromecast')
 
-# --- Database Setup (for device management only) ---
-# This part remains as device info is still stored in the DB.
-database_host = os.getenv('DATABASE_HOST', '127.0.0.1')
-database_port = os.getenv('DATABASE_PORT', '5432')
-database_user = os.getenv('DATABASE_USER', 'user')
-database_password = os.getenv('DATABASE_PASSWORD', 'password')
-database_name = os.getenv('DATABASE_NAME', 'vtlr')
+logger = logging.getLogger(__name__)
+
+# Longest a status request may block waiting for a job to finish.
+JOB_WAIT_MAX_SECONDS = 60
+# Seconds a client is asked to back off when the job queue is full.
+QUEUE_FULL_RETRY_AFTER = 5
+
+
+def parse_priority(value, default):
+  """Accepts "low", "normal", "high" or an integer; raises ValueError."""
+  if value is None:
+    return PRIORITIES[default]
+  if isinstance(value, str) and value in PRIORITIES:
+    return PRIORITIES[value]
+  if isinstance(value, int) and not isinstance(value, bool):
+    return value
+  raise ValueError("priority must be low, normal, high or an integer")
+
+
+def enqueue(job, data, default_priority="normal"):
+  """Records a job, hands it to its device lane and answers 202.
+
+  A job equal to one still waiting on the device is answered with the
+  waiting job's id instead; a full queue is answered with 429.
+  """
+  try:
+    job["priority"] = parse_priority(data.get("priority"), default_priority)
+  except ValueError as e:
+    return jsonify({"error": str(e)}), 400
+  if data.get("resume"):
+    job["resume"] = True
+
+  record = job_registry.create(job, data.get("callbackUrl"))
+  job["job_id"] = record["jobId"]
+  try:
+    queued = current_app.config['JOB_QUEUE'].put(job)
+  except QueueFull as e:
+    job_registry.discard(record["jobId"])
+    response = jsonify({"status": "error", "message": str(e)})
+    response.headers["Retry-After"] = str(QUEUE_FULL_RETRY_AFTER)
+    return response, 429
 
-DATABASE_URL = f"postgresql://{database_user}:{database_password}@{database_host}:{database_port}/{database_name}"
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
+  if queued is not job:
+    job_registry.discard(record["jobId"])
+    if data.get("callbackUrl"):
+      job_registry.add_callback(queued["job_id"], data["callbackUrl"])
+    return jsonify({"status": "queued", "jobId": queued["job_id"], "coalesced": True, "job": queued}), 202
+  return jsonify({"status": "queued", "jobId": record["jobId"], "job": job}), 202
 
 
 # --- Routes ---
@@ -30,53 +74,41 @@ def hello():
 
 @bp.route('/device', methods=['GET'])
 def find_all_devices():
-  """Gets all registered devices from the database."""
-  session = Session()
+  """Gets all registered devices from the device registry."""
   try:
-    all_devices = session.query(UserDevices).all()
     result = [{
         "deviceId": dev.id,
         "name": dev.device_name,
         "ip": dev.ip_address,
         "volume": dev.volume
-    } for dev in all_devices]
+    } for dev in device_registry.all()]
     return jsonify({"status": "success", "data": result}), 200
   except Exception as e:
     return jsonify({"status": "error", "message": str(e)}), 500
-  finally:
-    session.close()
 
 
 # Get device current connectivity
 @bp.route('/device/<deviceId>', methods=['GET'])
 def getDeviceConnectivity(deviceId):
-  session = Session()
-
-  device = session.query(UserDevices).filter_by(id=deviceId).scalar()
-  if device is None:
-    return jsonify({"status": "error", "message": "device not found"}), 404
-
-  result = findDevice(device.device_name, device.ip_address)
-  if result is None:
-    return jsonify({
-        "status": "success",
-        "data": {
-            "deviceId": deviceId,
-            "isConnected": False
-        }
-    }), 200
-
-  ret = jsonify({
+  """Answers from the background presence table, without discovery."""
+  presence = presence_tracker.get(deviceId)
+  if presence is None:
+    device = device_registry.get(deviceId)
+    if device is None:
+      return jsonify({"status": "error", "message": "device not found"}), 404
+
+    # Not tracked yet (e.g. just claimed); report it once it is probed.
+    presence_tracker.check(deviceId, device.device_name, device.ip_address)
+    presence = {"isConnected": False, "lastSeen": device.last_communication}
+
+  return jsonify({
       "status": "success",
       "data": {
           "deviceId": deviceId,
-          "isConnected": True
+          "isConnected": presence["isConnected"],
+          "lastSeen": presence["lastSeen"]
       }
-  })
-
-  session.close()
-
-  return ret
+  }), 200
 
 
 # Update device
@@ -87,27 +119,26 @@ def update_device(deviceId):
   if not data:
     return jsonify({"error": "Invalid or missing JSON payload"}), 400
 
-  session = Session()
-
-  device = session.query(UserDevices).filter_by(id=deviceId).first()
-  if device is None:
-    return jsonify({"status": "error", "message": "device not found"}), 404
-
-  if 'device_name' in data:
-    device.device_name = data['device_name']
-  if 'ip_address' in data:
-    device.ip_address = data['ip_address']
-  if 'volume' in data:
-    device.volume = data['volume']
-
   try:
-    session.commit()
-    return jsonify({"status": "success", "data": device.to_dict()}), 200
+    with session_scope() as session:
+      device = session.query(UserDevices).filter_by(id=deviceId).first()
+      if device is None:
+        return jsonify({"status": "error", "message": "device not found"}), 404
+
+      if 'device_name' in data:
+        device.device_name = data['device_name']
+      if 'ip_address' in data:
+        device.ip_address = data['ip_address']
+      if 'volume' in data:
+        device.volume = data['volume']
+
+      session.flush()
+      updated = device.to_dict()
+      device_registry.put(device)
+    return jsonify({"status": "success", "data": updated}), 200
   except Exception as e:
-    session.rollback()
+    device_registry.remove(deviceId)
     return jsonify({"status": "error", "message": str(e)}), 500
-  finally:
-    session.close()
 
 
 @bp.route('/device/play', methods=['POST'])
@@ -125,10 +156,8 @@ def command_to_device():
   if not all([device_id, media_url]):
     return jsonify({"error": "Missing deviceId or mediaUrl"}), 400
 
-  # Get device info from DB
-  session = Session()
   try:
-    device = session.query(UserDevices).filter_by(id=device_id).first()
+    device = device_registry.get(device_id)
     if not device:
       return jsonify({"error": f"Device with ID {device_id} not found"}), 404
 
@@ -140,18 +169,299 @@ def command_to_device():
         "content_type": content_type,
     }
 
-    job_queue = current_app.config['JOB_QUEUE']
-    job_queue.put(job)
+    # Download the clip while the job waits for the worker.
+    if media_cache:
+      media_cache.prefetch([media_url], content_type)
 
-    return jsonify({"status": "queued", "job": job}), 202
+    return enqueue(job, data)
 
   except Exception as e:
     return jsonify({"status": "error", "message": str(e)}), 500
-  finally:
-    session.close()
 
 
-logger = logging.getLogger(__name__)
+@bp.route('/broadcast', methods=['POST'])
+def broadcast_to_devices():
+  """Plays one media URL on several devices at the same moment.
+
+  Targets are given as deviceIds, or as group "all" for every registered
+  device. Each target's lane is claimed with the request's priority, so the
+  broadcast waits behind more important jobs. Runs synchronously and
+  returns per-device start timestamps.
+  """
+  data = request.get_json()
+  if not data:
+    return jsonify({"error": "Invalid JSON payload"}), 400
+
+  media_url = data.get("mediaUrl")
+  content_type = data.get("contentType", "audio/mp3")
+  device_ids = data.get("deviceIds")
+  group = data.get("group")
+
+  if not media_url:
+    return jsonify({"error": "Missing mediaUrl"}), 400
+  if group is not None and group != "all":
+    return jsonify({"error": "group must be \"all\""}), 400
+  if group is None and (not isinstance(device_ids, list) or not device_ids):
+    return jsonify({"error": "Missing deviceIds or group"}), 400
+  try:
+    priority = parse_priority(data.get("priority"), "normal")
+  except ValueError as e:
+    return jsonify({"error": str(e)}), 400
+
+  try:
+    if group is None:
+      found = {d: device_registry.get(d) for d in dict.fromkeys(device_ids)}
+      devices = [device for device in found.values() if device is not None]
+    else:
+      found = {}
+      devices = device_registry.all()
+  except Exception as e:
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+  missing = [str(d) for d, device in found.items() if device is None]
+  if missing:
+    return jsonify({"error": f"Devices not found: {', '.join(missing)}"}), 404
+  if not devices:
+    return jsonify({"error": "No devices to broadcast to"}), 404
+  if len(devices) > BROADCAST_MAX_DEVICES:
+    return jsonify(
+        {"error": f"A broadcast can target at most {BROADCAST_MAX_DEVICES} devices"}), 400
+
+  targets = []
+  for device in devices:
+    target = {
+        "action_type": "BROADCAST",
+        "device_id": str(device.id),
+        "device_name": device.device_name,
+        "device_ip": device.ip_address,
+        "priority": priority,
+    }
+    target["job_id"] = job_registry.create(target, data.get("callbackUrl"))["jobId"]
+    targets.append(target)
+
+  try:
+    result = broadcast(current_app.config['JOB_QUEUE'], targets, media_url, content_type)
+  except QueueFull as e:
+    for target in targets:
+      job_registry.discard(target["job_id"])
+    response = jsonify({"status": "error", "message": str(e)})
+    response.headers["Retry-After"] = str(QUEUE_FULL_RETRY_AFTER)
+    return response, 429
+  except Exception as e:
+    for target in targets:
+      job_registry.update(target["job_id"], FAILED, error=str(e))
+    return jsonify({"status": "error", "message": str(e)}), 500
+  return jsonify({"status": "success", "data": result}), 200
+
+
+@bp.route('/device/queue', methods=['POST'])
+def queue_to_device():
+  """Queues a request to append media URLs to the device's media queue."""
+  data = request.get_json()
+  if not data:
+    return jsonify({"error": "Invalid JSON payload"}), 400
+
+  device_id = data.get("deviceId")
+  media_urls = data.get("mediaUrls")
+  content_type = data.get("contentType", "audio/mp3")
+
+  if not device_id or not isinstance(media_urls, list) or not media_urls:
+    return jsonify({"error": "Missing deviceId or mediaUrls"}), 400
+
+  try:
+    device = device_registry.get(device_id)
+    if not device:
+      return jsonify({"error": f"Device with ID {device_id} not found"}), 404
+
+    job = {
+        "action_type": "QUEUE",
+        "device_name": device.device_name,
+        "device_ip": device.ip_address,
+        "media_urls": media_urls,
+        "content_type": content_type,
+    }
+
+    if media_cache:
+      media_cache.prefetch(media_urls, content_type)
+
+    return enqueue(job, data)
+
+  except Exception as e:
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@bp.route('/device/prepare', methods=['POST'])
+def prepare_device():
+  """Queues a warmup: connect to the device and pre-resolve its media.
+
+  TTS clips listed in mediaUrls are downloaded into the LAN media cache.
+  """
+  data = request.get_json()
+  if not data:
+    return jsonify({"error": "Invalid JSON payload"}), 400
+
+  device_id = data.get("deviceId")
+  youtube_url = data.get("youtubeUrl")
+  media_urls = data.get("mediaUrls") or []
+  content_type = data.get("contentType", "audio/mp3")
+
+  if not device_id:
+    return jsonify({"error": "Missing deviceId"}), 400
+  if not isinstance(media_urls, list):
+    return jsonify({"error": "mediaUrls must be a list"}), 400
+
+  try:
+    device = device_registry.get(device_id)
+    if not device:
+      return jsonify({"error": f"Device with ID {device_id} not found"}), 404
+
+    job = {
+        "action_type": "PREPARE",
+        "device_name": device.device_name,
+        "device_ip": device.ip_address,
+        "youtube_url": youtube_url,
+    }
+
+    # Resolve the stream now instead of when the lane reaches the job.
+    if youtube_url:
+      youtube_cache.prefetch([youtube_url])
+
+    # Clips of the upcoming playback are cached locally right away.
+    if media_cache and media_urls:
+      media_cache.prefetch(media_urls, content_type)
+
+    return enqueue(job, data)
+
+  except Exception as e:
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@bp.route('/lanes/stats', methods=['GET'])
+def lane_stats():
+  """Queue depth and wait times of each device lane."""
+  dispatcher = current_app.config['JOB_QUEUE']
+  return jsonify({"status": "success", "data": dispatcher.stats()}), 200
+
+
+@bp.route('/jobs/<jobId>', methods=['GET'])
+def get_job_status(jobId):
+  """Status of a queued job; ?wait=N blocks up to N seconds until it ends."""
+  try:
+    wait = min(max(float(request.args.get("wait", 0)), 0), JOB_WAIT_MAX_SECONDS)
+  except ValueError:
+    return jsonify({"error": "wait must be a number of seconds"}), 400
+
+  record = job_registry.wait(jobId, wait) if wait else job_registry.get(jobId)
+  if record is None:
+    return jsonify({"status": "error", "message": "job not found"}), 404
+  return jsonify({"status": "success", "data": record}), 200
+
+
+@bp.route('/jobs/stats', methods=['GET'])
+def job_stats():
+  return jsonify({"status": "success", "data": job_registry.stats()}), 200
+
+
+@bp.route('/youtube/prefetch', methods=['POST'])
+def prefetch_youtube():
+  """Resolves the audio streams of upcoming YouTube playbacks."""
+  data = request.get_json()
+  urls = data.get("urls") if isinstance(data, dict) else None
+  if not isinstance(urls, list) or not urls:
+    return jsonify({"error": "urls must be a non-empty list"}), 400
+
+  youtube_cache.prefetch(urls)
+  return jsonify({"status": "queued", "count": len(urls)}), 202
+
+
+@bp.route('/youtube/stats', methods=['GET'])
+def youtube_stats():
+  return jsonify({"status": "success", "data": youtube_cache.stats()}), 200
+
+
+@bp.route('/device/<deviceId>/stop', methods=['PUT'])
+def reschedule_stop(deviceId):
+  """Moves the timed stop of the device's current playback to `seconds` from now."""
+  data = request.get_json()
+  seconds = data.get("seconds") if isinstance(data, dict) else None
+  if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds < 0:
+    return jsonify({"error": "seconds must be a non-negative number"}), 400
+
+  device = device_registry.get(deviceId)
+  if device is None:
+    return jsonify({"status": "error", "message": "device not found"}), 404
+  if not stop_scheduler.reschedule((device.device_name, device.ip_address), seconds):
+    return jsonify({"status": "error", "message": "no timed stop pending"}), 404
+  return jsonify({"status": "success", "stopInSeconds": seconds}), 200
+
+
+@bp.route('/device/<deviceId>/stop', methods=['DELETE'])
+def cancel_stop(deviceId):
+  """Lets the device's current playback run to its end."""
+  device = device_registry.get(deviceId)
+  if device is None:
+    return jsonify({"status": "error", "message": "device not found"}), 404
+  if not stop_scheduler.cancel((device.device_name, device.ip_address)):
+    return jsonify({"status": "error", "message": "no timed stop pending"}), 404
+  return jsonify({"status": "success"}), 200
+
+
+@bp.route('/stops/stats', methods=['GET'])
+def stop_stats():
+  """Number of pending timed stops."""
+  return jsonify({"status": "success", "data": stop_scheduler.stats()}), 200
+
+
+@bp.route('/presence/stats', methods=['GET'])
+def presence_stats():
+  return jsonify({"status": "success", "data": presence_tracker.stats()}), 200
+
+
+@bp.route('/registry/stats', methods=['GET'])
+def device_registry_stats():
+  """Device registry hit rate and database connection pool usage."""
+  return jsonify({
+      "status": "success",
+      "data": {
+          "registry": device_registry.stats(),
+          "dbPool": pool_stats()
+      }
+  }), 200
+
+
+@bp.route('/pool/stats', methods=['GET'])
+def device_pool_stats():
+  return jsonify({"status": "success", "data": device_pool.stats()}), 200
+
+
+@bp.route('/media/<key>', methods=['GET'])
+def serve_media(key):
+  """Serves a cached clip to devices on the LAN, with Range support."""
+  entry = media_cache.get(key) if media_cache else None
+  if entry is None:
+    return jsonify({"error": "media not cached"}), 404
+
+  path, content_type = entry
+  try:
+    return send_file(path, mimetype=content_type, conditional=True, max_age=3600)
+  except FileNotFoundError:
+    # Evicted between the lookup and the open.
+    return jsonify({"error": "media not cached"}), 404
+
+
+@bp.route('/media/stats', methods=['GET'])
+def media_cache_stats():
+  if media_cache is None:
+    return jsonify({"status": "success", "data": {"enabled": False}}), 200
+  return jsonify({
+      "status": "success",
+      "data": {
+          "enabled": True,
+          **media_cache.stats()
+      }
+  }), 200
+
+
 
 
 # ... (inside play_youtube_command function)
@@ -171,10 +481,8 @@ def play_youtube_command():
   if not all([device_id, youtube_url]):
     return jsonify({"error": "Missing deviceId or youtubeUrl"}), 400
 
-  # Get device info from DB
-  session = Session()
   try:
-    device = session.query(UserDevices).filter_by(id=device_id).first()
+    device = device_registry.get(device_id)
     if not device:
       return jsonify({"error": f"Device with ID {device_id} not found"}), 404
 
@@ -186,15 +494,12 @@ def play_youtube_command():
         "duration": duration,
     }
 
-    job_queue = current_app.config['JOB_QUEUE']
-    job_queue.put(job)
+    youtube_cache.prefetch([youtube_url])
 
-    return jsonify({"status": "queued", "job": job}), 202
+    return enqueue(job, data, default_priority="low")
 
   except Exception as e:
     return jsonify({"status": "error", "message": str(e)}), 500
-  finally:
-    session.close()
 
 
 @bp.route('/device', methods=['POST'])
@@ -204,7 +509,6 @@ def claim_device():
   if not data:
     return jsonify({"error": "Invalid or missing JSON payload"}), 400
 
-  session = Session()
   try:
     # Assuming user_id is provided or handled appropriately
     new_device = UserDevices(
@@ -214,6 +518,7 @@ def claim_device():
         ip_address=data["ip_address"],
     )
 
+    # Reach the device before taking a database connection.
     info = findDevice(data["device_name"], data["ip_address"])
     if info:
       new_device.model = info.get("model")
@@ -221,30 +526,30 @@ def claim_device():
 
     new_device.last_communication = datetime.now()
 
-    session.add(new_device)
-    session.commit()
+    with session_scope() as session:
+      session.add(new_device)
+    device_registry.put(new_device)
+    presence_tracker.check(new_device.id, new_device.device_name,
+                           new_device.ip_address)
 
     # Assuming UserDevices has a to_dict() method or similar
     return jsonify({"status": "success", "data": new_device.to_dict()}), 201
 
   except Exception as e:
-    session.rollback()
     return jsonify({"status": "error", "message": str(e)}), 500
-  finally:
-    session.close()
 
 
 @bp.route('/device/<deviceId>', methods=['DELETE'])
 def unclaim_device(deviceId):
   """Unclaims a device by deleting it from the database."""
-  session = Session()
   try:
-    device = session.query(UserDevices).filter_by(id=deviceId).first()
-    if not device:
-      return jsonify({"error": f"Device with ID {deviceId} not found"}), 404
+    with session_scope() as session:
+      device = session.query(UserDevices).filter_by(id=deviceId).first()
+      if not device:
+        return jsonify({"error": f"Device with ID {deviceId} not found"}), 404
 
-    session.delete(device)
-    session.commit()
+      session.delete(device)
+    device_registry.remove(deviceId)
 
     return jsonify({
         "status": "success",
@@ -252,7 +557,4 @@ def unclaim_device(deviceId):
     }), 200
 
   except Exception as e:
-    session.rollback()
     return jsonify({"status": "error", "message": str(e)}), 500
-  finally:
-    session.close()
@@ -0,0 +1,141 @@
+"""Synchronized playback of one clip on several devices.
+
+The lane of every target is claimed first, so the broadcast waits behind
+more important jobs like any other job and nothing else drives a device
+while it takes part. The claimed targets are then connected in parallel,
+the clip is loaded paused on each, and once every device has it buffered
+the play commands are released together from a barrier. Per-device
+timestamps are returned so the skew between rooms can be measured.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.chromecast_service import connect, watch_playback, local_media_url
+from services.device_pool import POOL_CONNECT_TIMEOUT
+from services.dispatcher import QueueFull
+from services.job_status import job_registry, CONNECTING, FAILED
+from services.stop_scheduler import stop_scheduler
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+BROADCAST_MAX_DEVICES = int(os.getenv("BROADCAST_MAX_DEVICES", 16))
+BROADCAST_PRELOAD_TIMEOUT = float(os.getenv("BROADCAST_PRELOAD_TIMEOUT", 10))
+BROADCAST_START_TIMEOUT = float(os.getenv("BROADCAST_START_TIMEOUT", 5))
+# How long a target's lane may stay busy before the broadcast skips it.
+BROADCAST_CLAIM_TIMEOUT = float(os.getenv("BROADCAST_CLAIM_TIMEOUT", 30))
+# The longest one device can take to get ready: discovery and handshake,
+# then loading and buffering the clip.
+BROADCAST_BARRIER_TIMEOUT = 2 * POOL_CONNECT_TIMEOUT + 2 * BROADCAST_PRELOAD_TIMEOUT + 1
+
+
+def _wait_for(mc, ready, timeout: float):
+    """Polls the controller's pushed status until `ready(status)` holds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if mc.status and ready(mc.status):
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _arrive(barrier: threading.Barrier):
+    try:
+        barrier.wait(timeout=BROADCAST_BARRIER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass  # A device is stuck; start the ones that are ready anyway.
+
+
+def _play_on(target: dict, media_url: str, content_type: str, barrier: threading.Barrier):
+    result = {"deviceId": target["device_id"], "name": target["device_name"], "jobId": target["job_id"]}
+    try:
+        started = time.time()
+        job_registry.update(target["job_id"], CONNECTING)
+        cast = connect(target["device_name"], target["device_ip"])
+        watch_playback(cast, target["device_name"], target["device_ip"])
+        result["connectedAt"] = time.time()
+        result["connectSeconds"] = round(result["connectedAt"] - started, 3)
+
+        mc = cast.media_controller
+        mc.play_media(local_media_url(target["device_ip"], media_url, content_type), content_type, autoplay=False)
+        mc.block_until_active(timeout=BROADCAST_PRELOAD_TIMEOUT)
+        if not _wait_for(mc, lambda s: s.player_state == "PAUSED", BROADCAST_PRELOAD_TIMEOUT):
+            raise Exception("Media was not buffered in time.")
+        result["preloadedAt"] = time.time()
+    except Exception as e:
+        logging.error(f"Broadcast preload failed on {target['device_name']}: {e}")
+        job_registry.update(target["job_id"], FAILED, error=str(e))
+        # Still arrive at the barrier so the other devices do not wait for this one.
+        _arrive(barrier)
+        return {**result, "status": "error", "message": str(e)}
+
+    _arrive(barrier)
+
+    try:
+        result["commandAt"] = time.time()
+        mc.play()
+        stop_scheduler.cancel((target["device_name"], target["device_ip"]))
+        if _wait_for(mc, lambda s: s.player_is_playing, BROADCAST_START_TIMEOUT):
+            result["playingAt"] = time.time()
+        job_registry.start_playback(target["job_id"], (target["device_name"], target["device_ip"]),
+                                    mc.status.media_session_id if mc.status else None,
+                                    mc.status.duration if mc.status else None)
+    except Exception as e:
+        # The device dropped after preloading; the others already started.
+        logging.error(f"Broadcast start failed on {target['device_name']}: {e}")
+        job_registry.update(target["job_id"], FAILED, error=str(e))
+        return {**result, "status": "error", "message": str(e)}
+    return {**result, "status": "success"}
+
+
+def broadcast(dispatcher, targets: list, media_url: str, content_type: str = "audio/mp3"):
+    """
+    Plays media_url on every target at once. Targets are lane jobs with
+    device_id, device_name, device_ip, priority and job_id. Returns
+    per-device results and the spread of the start times. Raises QueueFull
+    if a target's lane cannot take the claim.
+    """
+    if len(targets) > BROADCAST_MAX_DEVICES:
+        raise ValueError(f"A broadcast can target at most {BROADCAST_MAX_DEVICES} devices.")
+
+    claimed = []
+    try:
+        for target in targets:
+            claimed.append(dispatcher.claim(target))
+    except QueueFull:
+        for target in claimed:
+            dispatcher.release(target)
+        raise
+
+    try:
+        deadline = time.monotonic() + BROADCAST_CLAIM_TIMEOUT
+        ready = [t for t in targets if t["claim"].wait(max(deadline - time.monotonic(), 0))]
+        results = {}
+        for target in targets:
+            if target in ready:
+                continue
+            message = "Device is busy with more important playback."
+            job_registry.update(target["job_id"], FAILED, error=message)
+            results[target["job_id"]] = {"deviceId": target["device_id"], "name": target["device_name"],
+                                         "jobId": target["job_id"], "status": "error", "message": message}
+
+        if ready:
+            barrier = threading.Barrier(len(ready))
+            with ThreadPoolExecutor(max_workers=len(ready), thread_name_prefix="broadcast") as executor:
+                futures = {t["job_id"]: executor.submit(_play_on, t, media_url, content_type, barrier) for t in ready}
+                results.update({job_id: future.result() for job_id, future in futures.items()})
+        results = [results[t["job_id"]] for t in targets]
+    finally:
+        for target in targets:
+            dispatcher.release(target)
+
+    started = [r["playingAt"] for r in results if r.get("playingAt")]
+    commanded = [r["commandAt"] for r in results if r.get("commandAt")]
+    return {
+        "devices": results,
+        "commandSkewSeconds": round(max(commanded) - min(commanded), 3) if commanded else None,
+        "startSkewSeconds": round(max(started) - min(started), 3) if started else None,
+    }
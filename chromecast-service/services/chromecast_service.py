@@ -1,23 +1,110 @@
-import pychromecast
-from pytubefix import YouTube
-from pytubefix.cli import on_progress
-import time
+from services.media_cache import media_cache
+from services.device_pool import device_pool
+from services.job_status import job_registry
+from services.youtube_cache import youtube_cache
+from services.stop_scheduler import stop_scheduler
+from pychromecast.controllers.media import MediaStatusListener
+import os
 import threading
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Longest a lane thread waits for a device to start loaded media.
+DEVICE_ACTIVE_TIMEOUT = float(os.getenv("DEVICE_ACTIVE_TIMEOUT", 10))
+
+# Device -> the pooled Chromecast its PlaybackListener is registered on.
+_watched_casts = {}
+_watched_lock = threading.Lock()
+
+
+class PlaybackListener(MediaStatusListener):
+    """Reports the end of playback on a device to the job registry."""
+
+    def __init__(self, device_key):
+        self.device_key = device_key
+
+    def new_media_status(self, status):
+        if not status.player_is_idle:
+            device_pool.touch(*self.device_key)
+        job_registry.media_status(self.device_key, status)
+
+    def load_media_failed(self, item: int, error_code: int):
+        job_registry.load_failed(self.device_key, error_code)
+
+
+def device_in_use(device_name: str, device_ip: str):
+    """Playing, or waiting for a timed stop; the pool must keep the connection."""
+    key = (device_name, device_ip)
+    return job_registry.is_playing(key) or stop_scheduler.remaining(key) is not None
+
+
+device_pool.in_use = device_in_use
+
+
+def wait_until_active(mc, device_name: str):
+    """block_until_active with a bound, so a dead speaker fails its job
+    instead of holding one of the shared lane threads forever."""
+    mc.block_until_active(timeout=DEVICE_ACTIVE_TIMEOUT)
+    if not mc.session_active_event.is_set():
+        raise Exception(f"{device_name} did not start the media within {DEVICE_ACTIVE_TIMEOUT:.0f}s.")
+
+
+def connect(device_name: str, device_ip: str):
+    """Returns a connected Chromecast from the device pool."""
+    return device_pool.get(device_name, device_ip)
+
+
+def watch_playback(cast, device_name: str, device_ip: str):
+    """Registers a PlaybackListener once per pooled connection."""
+    key = (device_name, device_ip)
+    with _watched_lock:
+        if _watched_casts.get(key) is cast:
+            return
+        _watched_casts[key] = cast
+    cast.media_controller.register_status_listener(PlaybackListener(key))
+
+
+def playback_started(job_id: str, device_name: str, device_ip: str, mc, replaced: bool = True):
+    if replaced:
+        # New media took over the device; a timed stop was for the old one.
+        stop_scheduler.cancel((device_name, device_ip))
+    session_id = mc.status.media_session_id if mc.status else None
+    duration = mc.status.duration if mc.status else None
+    job_registry.start_playback(job_id, (device_name, device_ip), session_id, duration)
+
+
+def prepare_device(device_name: str, device_ip: str, youtube_url: str = None):
+    """Connects to the device and resolves media ahead of a scheduled playback."""
+    logging.info(f"Preparing {device_name} for upcoming playback")
+    try:
+        if youtube_url:
+            youtube_cache.prefetch([youtube_url])
+        connect(device_name, device_ip)
+        if youtube_url:
+            youtube_cache.resolve(youtube_url)
+
+        return {"status": "success", "message": f"Prepared {device_name}."}
+    except Exception as e:
+        logging.error(f"Failed to prepare {device_name}: {e}")
+        return {"status": "error", "message": str(e)}
+
+
+def local_media_url(device_ip: str, media_url: str, content_type: str):
+    """Points the device at the LAN cache when it holds the clip."""
+    if media_cache is None:
+        return media_url
+    try:
+        return media_cache.playback_url(media_url, device_ip, content_type)
+    except Exception as e:
+        logging.error(f"Media cache lookup failed, using original URL: {e}")
+        return media_url
+
+
 def findDevice(name:str, ip:str):
-    # This function might not be needed anymore if all calls go through the queue
-    # but we'll keep it for now.
     try:
-        casts, browser = pychromecast.get_listed_chromecasts(friendly_names=[name], known_hosts=[ip])
-        if not casts:
-            logging.warning(f"Chromecast '{name}' not found at {ip}")
-            return None
-        cast = casts[0]
-        cast.wait()
+        cast = connect(name, ip)
         return {
             "model": cast.model_name,
             "manufacturer": cast.cast_info.manufacturer
@@ -26,25 +113,18 @@ def findDevice(name:str, ip:str):
         logging.error(f"Error finding device {name}: {e}")
         return None
 
-def play_media_url(device_name: str, device_ip: str, media_url: str, content_type: str = "audio/mp3"):
-    """Plays a media from a URL."""
+def play_media_url(device_name: str, device_ip: str, media_url: str, content_type: str = "audio/mp3", job_id: str = None):
+    """Plays a media from a URL; job_id, if given, finishes when it ends."""
     logging.info(f"Attempting to play media URL {media_url} on {device_name}")
     try:
-        casts, browser = pychromecast.get_listed_chromecasts(friendly_names=[device_name], known_hosts=[device_ip])
-        if not casts:
-            raise Exception(f"Device '{device_name}' not found.")
-
-        cast = casts[0]
-        cast.wait()
+        cast = connect(device_name, device_ip)
+        watch_playback(cast, device_name, device_ip)
 
         mc = cast.media_controller
-        mc.play_media(media_url, content_type)
-        mc.block_until_active()
+        mc.play_media(local_media_url(device_ip, media_url, content_type), content_type)
+        wait_until_active(mc, device_name)
+        playback_started(job_id, device_name, device_ip, mc)
         logging.info(f"Playback started on {device_name}.")
-        
-        # For generic media, we don't have a duration, so it plays until the end.
-        # The original implementation had a stop_event, which is a good idea for long-running tasks
-        # but for now, we'll let it play out.
 
         return {"status": "success", "message": f"Playing media on {device_name}."}
     except Exception as e:
@@ -52,41 +132,119 @@ def play_media_url(device_name: str, device_ip: str, media_url: str, content_typ
         return {"status": "error", "message": str(e)}
 
 
-def play_youtube_audio(device_name: str, device_ip: str, youtube_url: str, duration: int):
+def queue_media_urls(device_name: str, device_ip: str, media_urls: list, content_type: str = "audio/mp3", job_id: str = None):
+    """Appends media URLs to the device's media queue.
+
+    If the device is no longer playing (the previous item already finished),
+    the first URL is started normally and the rest are appended behind it.
+    """
+    logging.info(f"Attempting to queue {len(media_urls)} media URLs on {device_name}")
+    try:
+        cast = connect(device_name, device_ip)
+        watch_playback(cast, device_name, device_ip)
+
+        mc = cast.media_controller
+        mc.update_status()
+        remaining = [local_media_url(device_ip, url, content_type) for url in media_urls]
+        replaced = not mc.status or mc.status.player_is_idle
+        if replaced:
+            mc.play_media(remaining.pop(0), content_type)
+            wait_until_active(mc, device_name)
+
+        for media_url in remaining:
+            mc.play_media(media_url, content_type, enqueue=True)
+        playback_started(job_id, device_name, device_ip, mc, replaced)
+        logging.info(f"Queued {len(media_urls)} media URLs on {device_name}.")
+
+        return {"status": "success", "message": f"Queued {len(media_urls)} items on {device_name}."}
+    except Exception as e:
+        logging.error(f"Failed to queue media on {device_name}: {e}")
+        return {"status": "error", "message": str(e)}
+
+
+def media_snapshot(device_name: str, device_ip: str):
+    """What the device is playing and where, so it can be resumed later."""
+    try:
+        cast = connect(device_name, device_ip)
+        mc = cast.media_controller
+        mc.update_status()
+        status = mc.status
+        if not status or not status.content_id or not (status.player_is_playing or status.player_is_paused):
+            return None
+        return {
+            "content_id": status.content_id,
+            "content_type": status.content_type or "audio/mp3",
+            "current_time": status.adjusted_current_time,
+            "stop_in": stop_scheduler.remaining((device_name, device_ip)),
+        }
+    except Exception as e:
+        logging.error(f"Failed to read media status of {device_name}: {e}")
+        return None
+
+
+def resume_media(device_name: str, device_ip: str, content_id: str, content_type: str, current_time: float,
+                 stop_in: float = None, job_id: str = None):
+    """Reloads media that was interrupted, from where it stopped.
+
+    stop_in is what was left of the media's timed stop, if it had one.
+    """
+    logging.info(f"Resuming {content_id} on {device_name} at {current_time:.1f}s")
+    try:
+        cast = connect(device_name, device_ip)
+        watch_playback(cast, device_name, device_ip)
+
+        mc = cast.media_controller
+        mc.play_media(content_id, content_type, current_time=current_time)
+        wait_until_active(mc, device_name)
+        playback_started(job_id, device_name, device_ip, mc)
+        if stop_in is not None:
+            schedule_stop(device_name, device_ip, content_id, stop_in)
+
+        return {"status": "success", "message": f"Resumed media on {device_name}."}
+    except Exception as e:
+        logging.error(f"Failed to resume media on {device_name}: {e}")
+        return {"status": "error", "message": str(e)}
+
+
+def schedule_stop(device_name: str, device_ip: str, content_id: str, delay: float):
+    """Stops the device in `delay` seconds unless other media took over."""
+    def stop_playback():
+        try:
+            # The pool may have reconnected since the media was started.
+            cast = connect(device_name, device_ip)
+            mc = cast.media_controller
+            if mc.status and mc.status.content_id != content_id:
+                logging.info(f"{device_name} moved on to other media, not stopping it.")
+                return
+            mc.stop()
+            cast.quit_app()
+            logging.info(f"Playback stopped on {device_name}.")
+        except Exception as e:
+            logging.error(f"Error stopping playback on {device_name}: {e}")
+
+    logging.info(f"Playback on {device_name} will stop in {delay:.0f} seconds.")
+    stop_scheduler.schedule((device_name, device_ip), delay, stop_playback)
+
+
+def play_youtube_audio(device_name: str, device_ip: str, youtube_url: str, duration: int, job_id: str = None):
     """Plays audio from a YouTube URL for a specific duration."""
     logging.info(f"Attempting to play YouTube URL {youtube_url} on {device_name} for {duration}s")
     try:
-        casts, browser = pychromecast.get_listed_chromecasts(friendly_names=[device_name], known_hosts=[device_ip])
-        if not casts:
-            raise Exception(f"Device '{device_name}' not found.")
+        cast = connect(device_name, device_ip)
+        watch_playback(cast, device_name, device_ip)
 
-        cast = casts[0]
-        cast.wait()
-
-        yt = YouTube(youtube_url)
-        audio_stream = yt.streams.filter(only_audio=True).first()
-        if not audio_stream:
-            raise Exception("No audio stream found for the YouTube URL.")
+        stream_url, title, content_type = youtube_cache.resolve(youtube_url)
 
         mc = cast.media_controller
-        mc.play_media(audio_stream.url, 'audio/mp4')
-        mc.block_until_active()
+        mc.play_media(stream_url, content_type)
+        wait_until_active(mc, device_name)
+        playback_started(job_id, device_name, device_ip, mc)
         logging.info(f"YouTube playback started on {device_name}.")
 
         if duration > 0:
-            def stop_playback():
-                logging.info(f"Playback on {device_name} will stop in {duration} seconds.")
-                time.sleep(duration)
-                try:
-                    mc.stop()
-                    cast.quit_app()
-                    logging.info(f"Playback stopped on {device_name}.")
-                except Exception as e:
-                    logging.error(f"Error stopping playback on {device_name}: {e}")
-
-            threading.Thread(target=stop_playback).start()
-
-        return {"status": "success", "message": f"Playing '{yt.title}' on {device_name}."}
+            schedule_stop(device_name, device_ip, stream_url, duration)
+
+        return {"status": "success", "message": f"Playing '{title}' on {device_name}."}
     except Exception as e:
         logging.error(f"Failed to play YouTube audio on {device_name}: {e}")
         return {"status": "error", "message": str(e)}
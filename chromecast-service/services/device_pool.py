@@ -0,0 +1,231 @@
+"""Long-lived Chromecast connections, one per device.
+
+Discovery and the cast handshake cost seconds, so a connected Chromecast is
+kept and reused by every job for the same device. Dead connections are
+replaced on the next use, failing devices are retried with exponential
+backoff, and connections left unused for POOL_IDLE_SECONDS are closed by a
+reaper thread, unless the `in_use` hook reports the device as still playing.
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+
+import zeroconf
+import pychromecast
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+POOL_CONNECT_TIMEOUT = float(os.getenv("POOL_CONNECT_TIMEOUT", 10))
+POOL_IDLE_SECONDS = int(os.getenv("POOL_IDLE_SECONDS", 1800))
+POOL_REAP_INTERVAL = int(os.getenv("POOL_REAP_INTERVAL", 60))
+POOL_BACKOFF_BASE = float(os.getenv("POOL_BACKOFF_BASE", 1))
+POOL_BACKOFF_MAX = float(os.getenv("POOL_BACKOFF_MAX", 60))
+
+
+class DeviceUnavailable(Exception):
+    """The device could not be reached, or is backing off after failures."""
+
+
+class _Slot:
+    """Connection state for one device."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cast = None
+        self.last_used = 0.0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.connected_at = None
+        self.reuses = 0
+
+
+class DevicePool:
+
+    def __init__(self):
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper = None
+        # One Zeroconf for every discovery the pool runs; closed on shutdown.
+        self._zconf = None
+        # in_use(device_name, device_ip) -> True while media plays on it.
+        self.in_use = None
+        self.connects = 0
+        self.connect_failures = 0
+        self.reuses = 0
+        self.reconnects = 0
+        self.evictions = 0
+        self.connect_seconds_total = 0.0
+        self.connect_seconds_max = 0.0
+
+    def _slot(self, device_name: str, device_ip: str):
+        with self._lock:
+            slot = self._slots.get((device_name, device_ip))
+            if slot is None:
+                slot = self._slots[(device_name, device_ip)] = _Slot()
+            return slot
+
+    def get(self, device_name: str, device_ip: str):
+        """Returns a connected Chromecast for the device, connecting if needed."""
+        self._start_reaper()
+        slot = self._slot(device_name, device_ip)
+        with slot.lock:
+            if slot.cast is not None:
+                if slot.cast.socket_client.is_connected:
+                    slot.last_used = time.monotonic()
+                    slot.reuses += 1
+                    with self._lock:
+                        self.reuses += 1
+                    return slot.cast
+                logging.info(f"Connection to {device_name} was lost, reconnecting.")
+                self._close(slot)
+                with self._lock:
+                    self.reconnects += 1
+
+            now = time.monotonic()
+            if now < slot.retry_at:
+                raise DeviceUnavailable(f"Device '{device_name}' is unreachable, retrying in {slot.retry_at - now:.0f}s.")
+
+            try:
+                slot.cast = self._connect(device_name, device_ip)
+            except Exception as e:
+                slot.failures += 1
+                slot.retry_at = time.monotonic() + min(POOL_BACKOFF_BASE * 2 ** (slot.failures - 1), POOL_BACKOFF_MAX)
+                with self._lock:
+                    self.connect_failures += 1
+                raise DeviceUnavailable(str(e)) from e
+
+            slot.failures = 0
+            slot.retry_at = 0.0
+            slot.connected_at = slot.last_used = time.monotonic()
+            return slot.cast
+
+    def touch(self, device_name: str, device_ip: str):
+        """Counts activity on the device (e.g. a media status) as a use."""
+        with self._lock:
+            slot = self._slots.get((device_name, device_ip))
+        if slot is not None and slot.cast is not None:
+            slot.last_used = time.monotonic()
+
+    def is_connected(self, device_name: str, device_ip: str):
+        """True if the pool holds a live connection to the device."""
+        with self._lock:
+            slot = self._slots.get((device_name, device_ip))
+        cast = slot.cast if slot else None
+        return cast is not None and cast.socket_client.is_connected
+
+    def _zeroconf(self):
+        with self._lock:
+            if self._zconf is None:
+                self._zconf = zeroconf.Zeroconf()
+            return self._zconf
+
+    def _connect(self, device_name: str, device_ip: str):
+        started = time.monotonic()
+        casts, browser = pychromecast.get_listed_chromecasts(friendly_names=[device_name],
+                                                             known_hosts=[device_ip],
+                                                             discovery_timeout=POOL_CONNECT_TIMEOUT,
+                                                             zeroconf_instance=self._zeroconf())
+        # The cast keeps its own socket; the zeroconf browser is not needed.
+        browser.stop_discovery()
+        if not casts:
+            raise Exception(f"Device '{device_name}' not found.")
+
+        cast = casts[0]
+        cast.wait(timeout=POOL_CONNECT_TIMEOUT)
+        if not cast.socket_client.is_connected:
+            cast.disconnect(timeout=1)
+            raise Exception(f"Timed out connecting to '{device_name}'.")
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds_total += elapsed
+            self.connect_seconds_max = max(self.connect_seconds_max, elapsed)
+        logging.info(f"Connected to {device_name} in {elapsed:.2f}s.")
+        return cast
+
+    def _close(self, slot: _Slot):
+        cast, slot.cast = slot.cast, None
+        slot.connected_at = None
+        if cast is not None:
+            try:
+                cast.disconnect(timeout=1)
+            except Exception as e:
+                logging.error(f"Error disconnecting from {cast.name}: {e}")
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="device-pool-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap(self):
+        while not self._stop.wait(POOL_REAP_INTERVAL):
+            self.evict_idle()
+
+    def evict_idle(self, idle_seconds: float = POOL_IDLE_SECONDS):
+        """Closes connections that have not been used for `idle_seconds`."""
+        now = time.monotonic()
+        with self._lock:
+            slots = list(self._slots.items())
+        for (device_name, device_ip), slot in slots:
+            # Skip devices that are busy connecting or playing right now.
+            if not slot.lock.acquire(blocking=False):
+                continue
+            try:
+                if slot.cast is not None and now - slot.last_used >= idle_seconds:
+                    if self.in_use is not None and self.in_use(device_name, device_ip):
+                        slot.last_used = now
+                        continue
+                    logging.info(f"Closing idle connection to {device_name}.")
+                    self._close(slot)
+                    with self._lock:
+                        self.evictions += 1
+            finally:
+                slot.lock.release()
+
+    def shutdown(self):
+        self._stop.set()
+        with self._lock:
+            slots = list(self._slots.values())
+        for slot in slots:
+            with slot.lock:
+                self._close(slot)
+        with self._lock:
+            zconf, self._zconf = self._zconf, None
+        if zconf is not None:
+            zconf.close()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            devices = [{
+                "name": name,
+                "ip": ip,
+                "connected": slot.cast is not None,
+                "connectedSeconds": round(now - slot.connected_at, 1) if slot.connected_at else None,
+                "idleSeconds": round(now - slot.last_used, 1) if slot.cast is not None else None,
+                "reuses": slot.reuses,
+                "failures": slot.failures,
+            } for (name, ip), slot in self._slots.items()]
+            return {
+                "connections": sum(1 for d in devices if d["connected"]),
+                "connects": self.connects,
+                "connectFailures": self.connect_failures,
+                "reuses": self.reuses,
+                "reconnects": self.reconnects,
+                "evictions": self.evictions,
+                "connectSecondsAvg": self.connect_seconds_total / self.connects if self.connects else None,
+                "connectSecondsMax": self.connect_seconds_max,
+                "devices": devices,
+            }
+
+
+device_pool = DevicePool()
+atexit.register(device_pool.shutdown)
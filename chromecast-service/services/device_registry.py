@@ -0,0 +1,123 @@
+"""In-process copy of the registered devices.
+
+Play requests only need a device's name and address, so they are answered
+from memory instead of a Postgres query each. The table is loaded at
+startup, updated by the routes that change devices, and reloaded every
+DEVICE_REGISTRY_TTL seconds to pick up edits made outside this service.
+An id missing from memory is looked up in the database once before it is
+reported as not found.
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import namedtuple
+
+from models.database import session_scope
+from models.users_device import UserDevices
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEVICE_REGISTRY_TTL = int(os.getenv("DEVICE_REGISTRY_TTL", 300))
+
+DeviceRecord = namedtuple("DeviceRecord", ["id", "user_id", "device_name", "ip_address", "mac_address",
+                                           "manufacturer", "model", "volume", "last_communication"])
+
+
+def to_record(device: UserDevices):
+    return DeviceRecord(**{field: getattr(device, field) for field in DeviceRecord._fields})
+
+
+def _key(device_id):
+    """Normalized id, or None when it cannot be a device id."""
+    try:
+        return str(uuid.UUID(str(device_id)))
+    except ValueError:
+        return None
+
+
+class DeviceRegistry:
+
+    def __init__(self, ttl: int = DEVICE_REGISTRY_TTL):
+        self.ttl = ttl
+        self._devices = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def load(self):
+        """Replaces the table with the current contents of user_devices."""
+        with session_scope() as session:
+            devices = {str(d.id): to_record(d) for d in session.query(UserDevices).all()}
+        with self._lock:
+            self._devices = devices
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+        logging.info(f"Device registry loaded {len(devices)} devices.")
+
+    def _refresh_if_stale(self):
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+        if not stale:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            if self._loaded_at is None:
+                raise
+            # Keep answering from the previous copy until the database is back.
+            logging.error(f"Failed to reload the device registry: {e}")
+
+    def get(self, device_id):
+        """The device's DeviceRecord, or None if it is not registered."""
+        key = _key(device_id)
+        if key is None:
+            return None
+        self._refresh_if_stale()
+        with self._lock:
+            device = self._devices.get(key)
+            if device is not None:
+                self.hits += 1
+                return device
+            self.misses += 1
+
+        with session_scope() as session:
+            device = session.query(UserDevices).filter_by(id=key).first()
+            if device is None:
+                return None
+            record = to_record(device)
+        self.put(record)
+        return record
+
+    def all(self):
+        self._refresh_if_stale()
+        with self._lock:
+            return list(self._devices.values())
+
+    def put(self, device):
+        """Stores a created or updated device (a model or a DeviceRecord)."""
+        record = device if isinstance(device, DeviceRecord) else to_record(device)
+        with self._lock:
+            self._devices[str(record.id)] = record
+
+    def remove(self, device_id):
+        with self._lock:
+            self._devices.pop(_key(device_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "ttlSeconds": self.ttl,
+                "ageSeconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            }
+
+
+device_registry = DeviceRegistry()
@@ -0,0 +1,230 @@
+"""Runs playback jobs in one priority-ordered lane per device.
+
+Jobs for the same device run one at a time, highest priority first and in
+the order they were queued within a priority, while jobs for different
+devices run in parallel on a shared pool of DISPATCH_MAX_CONCURRENCY
+threads, so a slow speaker never holds up the others.
+
+The number of waiting jobs is bounded (put raises QueueFull), and a job
+that repeats one still waiting in its lane is folded into it.
+
+A caller that must drive several devices itself (a synchronized broadcast)
+claims their lanes instead: the claim waits its turn like a job, and the
+lane then stays reserved for the caller until it is released.
+"""
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DISPATCH_MAX_CONCURRENCY = int(os.getenv("DISPATCH_MAX_CONCURRENCY", 4))
+DISPATCH_MAX_QUEUED = int(os.getenv("DISPATCH_MAX_QUEUED", 256))
+DISPATCH_MAX_LANE_DEPTH = int(os.getenv("DISPATCH_MAX_LANE_DEPTH", 32))
+# How often a job held back by more important playback checks again.
+DISPATCH_HOLD_RETRY_SECONDS = float(os.getenv("DISPATCH_HOLD_RETRY_SECONDS", 1))
+
+PRIORITIES = {"low": 0, "normal": 5, "high": 10}
+
+
+class QueueFull(Exception):
+    """The device lane, or the dispatcher as a whole, is at capacity."""
+
+
+def coalesce_key(job):
+    """Jobs with equal keys in the same lane would play the same thing."""
+    return (job.get("action_type"), job.get("media_url"), tuple(job.get("media_urls") or ()),
+            job.get("youtube_url"), job.get("duration"))
+
+
+class _Lane:
+
+    def __init__(self):
+        self.jobs = []  # heap of [-priority, seq, job, queued_at]
+        self.running = False
+        self.started = 0
+        self.processed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.held = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.last_wait_seconds = None
+
+
+class Dispatcher:
+
+    def __init__(self, handler, can_start=None, max_concurrency: int = DISPATCH_MAX_CONCURRENCY,
+                 max_queued: int = DISPATCH_MAX_QUEUED, max_lane_depth: int = DISPATCH_MAX_LANE_DEPTH):
+        """
+        handler(job) runs a job. can_start(job), if given, may hold the next
+        job of a lane back (e.g. while more important media plays); it is
+        asked again every DISPATCH_HOLD_RETRY_SECONDS without a pool thread
+        waiting on it.
+        """
+        self.handler = handler
+        self.can_start = can_start
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.max_lane_depth = max_lane_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="lane")
+        self._lanes = {}
+        self._queued = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @staticmethod
+    def lane_key(job):
+        return job.get("device_name"), job.get("device_ip")
+
+    def put(self, job):
+        """
+        Queues a job in its device lane and returns the job that will run:
+        `job` itself, or an equal job already waiting, which takes the higher
+        of the two priorities. Raises QueueFull when at capacity.
+        """
+        key = self.lane_key(job)
+        priority = job.get("priority", PRIORITIES["normal"])
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _Lane()
+
+            for entry in lane.jobs:
+                if "claim" in job or "claim" in entry[2]:
+                    continue
+                if coalesce_key(entry[2]) == coalesce_key(job):
+                    lane.coalesced += 1
+                    if priority > -entry[0]:
+                        entry[0] = -priority
+                        entry[2]["priority"] = priority
+                        heapq.heapify(lane.jobs)
+                    return entry[2]
+
+            if self._queued >= self.max_queued or len(lane.jobs) >= self.max_lane_depth:
+                self.rejected += 1
+                raise QueueFull(f"Too many queued jobs for '{job.get('device_name')}'.")
+
+            heapq.heappush(lane.jobs, [-priority, next(self._seq), job, time.monotonic()])
+            self._queued += 1
+            if lane.running:
+                return job
+            lane.running = True
+        self._executor.submit(self._run_next, key)
+        return job
+
+    def claim(self, job):
+        """
+        Queues `job` as a claim on its lane. When its turn comes the handler
+        is not run; job["claim"] is set instead and the lane runs nothing
+        else until release(job). Raises QueueFull like put.
+        """
+        job["claim"] = threading.Event()
+        self.put(job)
+        return job
+
+    def release(self, job):
+        """Hands a claimed lane back, or withdraws a claim not granted yet."""
+        key = self.lane_key(job)
+        with self._lock:
+            if not job.get("granted"):
+                job["withdrawn"] = True
+                return
+            job["granted"] = False
+            lane = self._lanes[key]
+            if not lane.jobs:
+                lane.running = False
+                return
+        self._resubmit(key)
+
+    def _resubmit(self, key):
+        self._executor.submit(self._run_next, key)
+
+    def _run_next(self, key):
+        with self._lock:
+            lane = self._lanes[key]
+            job = lane.jobs[0][2]
+
+        if self.can_start is not None and not job.get("withdrawn") and not self.can_start(job):
+            with self._lock:
+                lane.held += 1
+            timer = threading.Timer(DISPATCH_HOLD_RETRY_SECONDS, self._resubmit, args=(key,))
+            timer.daemon = True
+            timer.start()
+            return
+
+        with self._lock:
+            # Pop afresh: a more important job may have arrived meanwhile.
+            _, _, job, queued_at = heapq.heappop(lane.jobs)
+            self._queued -= 1
+            waited = time.monotonic() - queued_at
+            lane.started += 1
+            lane.wait_seconds_total += waited
+            lane.wait_seconds_max = max(lane.wait_seconds_max, waited)
+            lane.last_wait_seconds = waited
+
+            if "claim" in job:
+                if not job.get("withdrawn"):
+                    job["granted"] = True
+                    lane.processed += 1
+                    job["claim"].set()
+                    return
+                if not lane.jobs:
+                    lane.running = False
+                    return
+        if "claim" in job:
+            self._resubmit(key)
+            return
+
+        logging.info(f"Got job: {job} (waited {waited:.2f}s)")
+        try:
+            result = self.handler(job)
+            failed = isinstance(result, dict) and result.get("status") == "error"
+        except Exception as e:
+            failed = True
+            logging.error(f"Error processing job {job}: {e}")
+
+        with self._lock:
+            lane.processed += 1
+            lane.failed += failed
+            if not lane.jobs:
+                lane.running = False
+                return
+        # Go to the back of the pool's queue so other lanes get their turn.
+        self._resubmit(key)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            lanes = [{
+                "deviceName": name,
+                "deviceIp": ip,
+                "depth": len(lane.jobs),
+                "running": lane.running,
+                "processed": lane.processed,
+                "failed": lane.failed,
+                "coalesced": lane.coalesced,
+                "held": lane.held,
+                "nextPriority": -lane.jobs[0][0] if lane.jobs else None,
+                "waitSecondsAvg": lane.wait_seconds_total / lane.started if lane.started else None,
+                "waitSecondsMax": lane.wait_seconds_max,
+                "lastWaitSeconds": lane.last_wait_seconds,
+                "oldestQueuedSeconds": now - min(entry[3] for entry in lane.jobs) if lane.jobs else None,
+            } for (name, ip), lane in self._lanes.items()]
+            queued = self._queued
+            rejected = self.rejected
+        return {
+            "maxConcurrency": self.max_concurrency,
+            "maxQueued": self.max_queued,
+            "maxLaneDepth": self.max_lane_depth,
+            "active": sum(1 for lane in lanes if lane["running"]),
+            "queued": queued,
+            "rejected": rejected,
+            "lanes": lanes,
+        }
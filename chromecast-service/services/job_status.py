@@ -0,0 +1,247 @@
+"""Status records for queued playback jobs.
+
+Every job accepted by the routes gets a record that moves through
+queued -> connecting -> playing -> finished, or ends in failed. Callers can
+read it, long-poll until it is done, or pass a callbackUrl that receives
+the final record as a POST. A job can have several callbacks, e.g. when
+later requests are coalesced into it.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JOB_STATUS_MAX_RECORDS = int(os.getenv("JOB_STATUS_MAX_RECORDS", 1000))
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("JOB_WEBHOOK_TIMEOUT", 5))
+JOB_WEBHOOK_ATTEMPTS = int(os.getenv("JOB_WEBHOOK_ATTEMPTS", 3))
+# A playing job whose end is never reported fails this long after its
+# media should have ended, or after JOB_PLAYING_MAX_SECONDS for media of
+# unknown length.
+JOB_PLAYING_GRACE = float(os.getenv("JOB_PLAYING_GRACE", 60))
+JOB_PLAYING_MAX_SECONDS = float(os.getenv("JOB_PLAYING_MAX_SECONDS", 4 * 3600))
+
+QUEUED = "queued"
+CONNECTING = "connecting"
+PLAYING = "playing"
+FINISHED = "finished"
+FAILED = "failed"
+TERMINAL = (FINISHED, FAILED)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobRegistry:
+    """Bounded store of job records; the oldest are dropped first."""
+
+    def __init__(self, max_records: int = JOB_STATUS_MAX_RECORDS):
+        self.max_records = max_records
+        self._jobs = OrderedDict()
+        self._callbacks = {}  # job id -> [callback url]
+        self._playing = {}  # (device name, ip) -> [(job id, media session id, expires at)]
+        self._changed = threading.Condition()
+
+    def create(self, job: dict, callback_url: str = None):
+        job_id = str(uuid.uuid4())
+        now = _now()
+        record = {
+            "jobId": job_id,
+            "actionType": job.get("action_type"),
+            "deviceName": job.get("device_name"),
+            "priority": job.get("priority"),
+            "status": QUEUED,
+            "createdAt": now,
+            "updatedAt": now,
+            "history": [{"status": QUEUED, "at": now}],
+            "error": None,
+        }
+        with self._changed:
+            self._jobs[job_id] = record
+            if callback_url:
+                self._callbacks[job_id] = [callback_url]
+            while len(self._jobs) > self.max_records:
+                old_id, _ = self._jobs.popitem(last=False)
+                self._callbacks.pop(old_id, None)
+        return dict(record)
+
+    def add_callback(self, job_id: str, callback_url: str):
+        """Also notifies `callback_url` when the job ends."""
+        with self._changed:
+            record = self._jobs.get(job_id)
+            if record is None:
+                return
+            if record["status"] not in TERMINAL:
+                self._callbacks.setdefault(job_id, []).append(callback_url)
+                return
+            final = json.loads(json.dumps(record))
+        # Already over; report it right away.
+        threading.Thread(target=self._notify, args=(callback_url, final), name="job-webhook", daemon=True).start()
+
+    def discard(self, job_id: str):
+        """Drops a record whose job was never queued (rejected or coalesced)."""
+        with self._changed:
+            self._jobs.pop(job_id, None)
+            self._callbacks.pop(job_id, None)
+
+    def get(self, job_id: str):
+        with self._changed:
+            record = self._jobs.get(job_id)
+            return json.loads(json.dumps(record)) if record else None
+
+    def update(self, job_id: str, status: str, error: str = None, **details):
+        """Moves a job to `status`; terminal records are never changed again."""
+        if not job_id:
+            return
+        with self._changed:
+            record = self._jobs.get(job_id)
+            if record is None or record["status"] in TERMINAL:
+                return
+            now = _now()
+            record["status"] = status
+            record["updatedAt"] = now
+            record["history"].append({"status": status, "at": now})
+            if error:
+                record["error"] = error
+            record.update(details)
+            callback_urls = self._callbacks.pop(job_id, []) if status in TERMINAL else []
+            final = json.loads(json.dumps(record)) if callback_urls else None
+            self._changed.notify_all()
+
+        for callback_url in callback_urls:
+            threading.Thread(target=self._notify, args=(callback_url, final), name="job-webhook", daemon=True).start()
+
+    def wait(self, job_id: str, timeout: float):
+        """Blocks until the job is finished or failed, or `timeout` passes."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                record = self._jobs.get(job_id)
+                remaining = deadline - time.monotonic()
+                if record is None or record["status"] in TERMINAL or remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+        return self.get(job_id)
+
+    # --- playback tracking ---
+    def _expires_at(self, duration, current_time=None):
+        """When to stop trusting a playing entry nobody reported the end of."""
+        if duration:
+            return time.monotonic() + max(duration - (current_time or 0), 0) + JOB_PLAYING_GRACE
+        return time.monotonic() + JOB_PLAYING_MAX_SECONDS
+
+    def _live_playing(self, device_key):
+        """Drops entries past their expiry; returns (live entries, expired job ids).
+
+        Covers devices that dropped off (power cycle, network loss) without
+        reporting the end of their media. Call with the lock held.
+        """
+        now = time.monotonic()
+        playing = self._playing.get(device_key, [])
+        expired = [j for j, _, expires_at in playing if expires_at <= now]
+        if expired:
+            playing = [entry for entry in playing if entry[2] > now]
+            self._playing[device_key] = playing
+        return playing, expired
+
+    def _fail_lost(self, expired):
+        for job_id in expired:
+            self.update(job_id, FAILED, error="Lost track of playback on the device.")
+
+    def start_playback(self, job_id: str, device_key, media_session_id, duration: float = None):
+        """Marks the job playing; it finishes when that media session ends.
+
+        Jobs that queued into the same session finish together with it,
+        while a new session interrupts whatever the device was playing. If
+        the end is never reported, the job fails `duration` plus
+        JOB_PLAYING_GRACE seconds later (JOB_PLAYING_MAX_SECONDS if unknown).
+        """
+        if not job_id:
+            return
+        with self._changed:
+            playing = self._playing.get(device_key, [])
+            interrupted = [j for j, session, _ in playing if session != media_session_id]
+            self._playing[device_key] = [entry for entry in playing if entry[1] == media_session_id] + [
+                (job_id, media_session_id, self._expires_at(duration))]
+        for previous in interrupted:
+            self.update(previous, FINISHED, idleReason="INTERRUPTED")
+        self.update(job_id, PLAYING, mediaSessionId=media_session_id)
+
+    def is_playing(self, device_key):
+        """True while a job's media is playing on the device."""
+        with self._changed:
+            playing, expired = self._live_playing(device_key)
+        self._fail_lost(expired)
+        return bool(playing)
+
+    def playing_priority(self, device_key):
+        """Highest priority among the jobs playing on a device, or None."""
+        with self._changed:
+            playing, expired = self._live_playing(device_key)
+            priorities = [self._jobs[j].get("priority") for j, _, _ in playing if j in self._jobs]
+        self._fail_lost(expired)
+        priorities = [p for p in priorities if p is not None]
+        return max(priorities) if priorities else None
+
+    def media_status(self, device_key, status):
+        """Called by the device's media status listener."""
+        if status.player_state != "IDLE":
+            # Still going: push the expiry of this session's jobs forward.
+            with self._changed:
+                self._playing[device_key] = [
+                    (j, session, self._expires_at(status.duration, status.current_time))
+                    if session is None or session == status.media_session_id else (j, session, expires_at)
+                    for j, session, expires_at in self._playing.get(device_key, [])]
+            return
+        if not status.idle_reason:
+            return
+        with self._changed:
+            playing = self._playing.get(device_key, [])
+            # Ignore the end of media that was loaded before these jobs.
+            ended = [j for j, session, _ in playing
+                     if session is None or status.media_session_id in (None, session)]
+            if not ended:
+                return
+            self._playing[device_key] = [entry for entry in playing if entry[0] not in ended]
+        for job_id in ended:
+            if status.idle_reason == "ERROR":
+                self.update(job_id, FAILED, error="Playback failed on the device.", idleReason=status.idle_reason)
+            else:
+                self.update(job_id, FINISHED, idleReason=status.idle_reason)
+
+    def load_failed(self, device_key, error_code: int):
+        with self._changed:
+            playing = self._playing.pop(device_key, [])
+        for job_id, _, _ in playing:
+            self.update(job_id, FAILED, error=f"Device could not load media (error {error_code}).")
+
+    def _notify(self, callback_url: str, record: dict):
+        body = json.dumps(record).encode("utf-8")
+        for attempt in range(JOB_WEBHOOK_ATTEMPTS):
+            try:
+                request = urllib.request.Request(callback_url, data=body, method="POST",
+                                                 headers={"Content-Type": "application/json"})
+                with urllib.request.urlopen(request, timeout=JOB_WEBHOOK_TIMEOUT):
+                    return
+            except Exception as e:
+                logging.warning(f"Webhook for job {record['jobId']} failed (attempt {attempt + 1}): {e}")
+                time.sleep(2 ** attempt)
+        logging.error(f"Giving up on webhook for job {record['jobId']}.")
+
+    def stats(self):
+        with self._changed:
+            counts = {}
+            for record in self._jobs.values():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+            return {"records": len(self._jobs), "byStatus": counts, "playing": sum(len(p) for p in self._playing.values())}
+
+
+job_registry = JobRegistry()
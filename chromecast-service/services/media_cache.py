@@ -0,0 +1,192 @@
+"""Bounded on-disk cache of media played on the LAN devices.
+
+Clips are stored under a key derived from the media URL without its
+X-Amz-* presign parameters, so every presigned URL for the same stored
+object maps to the same entry while other query strings still tell media
+apart. Cached clips are served by this service (see the /media route) and
+devices fetch them over the LAN instead of going back to object storage.
+"""
+import os
+import re
+import socket
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+MEDIA_CACHE_ENABLED = os.getenv("MEDIA_CACHE_ENABLED", "true").lower() == "true"
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "vtlr-media-cache"))
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+MEDIA_CACHE_MAX_ITEM_BYTES = int(os.getenv("MEDIA_CACHE_MAX_ITEM_BYTES", 16 * 1024 * 1024))
+MEDIA_CACHE_FETCH_TIMEOUT = float(os.getenv("MEDIA_CACHE_FETCH_TIMEOUT", 10))
+MEDIA_CACHE_PREFETCH_WORKERS = int(os.getenv("MEDIA_CACHE_PREFETCH_WORKERS", 2))
+
+# Address devices use to reach this service. When unset, the local address
+# of the route towards the device is used with MEDIA_CACHE_PORT.
+MEDIA_CACHE_BASE_URL = os.getenv("MEDIA_CACHE_BASE_URL")
+MEDIA_CACHE_PORT = int(os.getenv("MEDIA_CACHE_PORT", os.getenv("FLASK_RUN_PORT", 4001)))
+
+# Names of the files this cache writes: a sha1 key, or a partial download.
+CACHE_FILE_NAME = re.compile(r"[0-9a-f]{40}(\.part)?")
+
+
+def cache_key(media_url: str):
+    parts = urlsplit(media_url)
+    query = urlencode([(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if not name.lower().startswith("x-amz-")])
+    return hashlib.sha1(f"{parts.netloc}{parts.path}?{query}".encode("utf-8")).hexdigest()
+
+
+def lan_address(device_ip: str):
+    """Local IP address the OS would use to talk to `device_ip`."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.connect((device_ip, 8009))  # UDP connect sends nothing
+        return s.getsockname()[0]
+
+
+class MediaCache:
+    """LRU of media files on disk, bounded by total size."""
+
+    def __init__(self, directory: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (path, size, content_type)
+        self._bytes = 0
+        self._fetching = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MEDIA_CACHE_PREFETCH_WORKERS,
+                                            thread_name_prefix="media-prefetch")
+        self.hits = 0
+        self.misses = 0
+        self.fetched = 0
+        self.evicted = 0
+
+        # Entries are not persisted across restarts. Only files the cache
+        # wrote itself are removed, in case the directory is shared.
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if CACHE_FILE_NAME.fullmatch(name) and os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def get(self, key: str):
+        """Returns (path, content_type) of a cached clip, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[2]
+
+    def fetch(self, media_url: str, content_type: str = "audio/mp3"):
+        """Downloads `media_url` into the cache unless it is already there."""
+        key = cache_key(media_url)
+        with self._lock:
+            if key in self._entries:
+                return key
+            pending = self._fetching.get(key)
+            if pending is None:
+                pending = self._fetching[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            pending.wait(MEDIA_CACHE_FETCH_TIMEOUT)
+            return key if self.get(key) else None
+
+        try:
+            path = os.path.join(self.directory, key)
+            size = self._download(media_url, path)
+            if size is None:
+                return None
+            self._add(key, path, size, content_type)
+            return key
+        except Exception as e:
+            logging.error(f"Failed to cache media {urlsplit(media_url).path}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._fetching.pop(key, None)
+            pending.set()
+
+    def _download(self, media_url: str, path: str):
+        tmp = f"{path}.part"
+        size = 0
+        with urllib.request.urlopen(media_url, timeout=MEDIA_CACHE_FETCH_TIMEOUT) as response, open(tmp, "wb") as f:
+            while True:
+                chunk = response.read(64 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MEDIA_CACHE_MAX_ITEM_BYTES:
+                    f.close()
+                    os.remove(tmp)
+                    logging.info(f"Not caching {urlsplit(media_url).path}: larger than {MEDIA_CACHE_MAX_ITEM_BYTES} bytes")
+                    return None
+                f.write(chunk)
+        os.replace(tmp, path)
+        return size
+
+    def _add(self, key: str, path: str, size: int, content_type: str):
+        evicted = []
+        with self._lock:
+            self._entries[key] = (path, size, content_type)
+            self._bytes += size
+            self.fetched += 1
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (old_path, old_size, _) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evicted += 1
+                evicted.append(old_path)
+        # Devices still streaming an evicted file keep their open handle.
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def prefetch(self, media_urls: list, content_type: str = "audio/mp3"):
+        """Starts caching clips that are about to be played."""
+        for media_url in media_urls:
+            self._executor.submit(self.fetch, media_url, content_type)
+
+    def playback_url(self, media_url: str, device_ip: str, content_type: str = "audio/mp3"):
+        """URL the device should play: the local copy when cached, otherwise
+        the original URL while the clip is cached for next time."""
+        key = cache_key(media_url)
+        if self.get(key) is None:
+            with self._lock:
+                self.misses += 1
+            self.prefetch([media_url], content_type)
+            return media_url
+
+        with self._lock:
+            self.hits += 1
+        base_url = MEDIA_CACHE_BASE_URL or f"http://{lan_address(device_ip)}:{MEDIA_CACHE_PORT}"
+        return f"{base_url}/v1.0/chromecast/media/{key}"
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetched": self.fetched,
+                "evicted": self.evicted,
+            }
+
+
+media_cache = MediaCache() if MEDIA_CACHE_ENABLED else None
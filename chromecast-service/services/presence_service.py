@@ -0,0 +1,196 @@
+"""Background presence tracking for the registered devices.
+
+Routes read an in-memory presence table instead of running discovery per
+request. The table is fed by a zeroconf browser (devices announcing
+themselves) and by a periodic probe of every registered device: a live
+pooled connection counts as present, otherwise a TCP connect to the cast
+port is tried. Sightings are written to user_devices.last_communication in
+one batch per PRESENCE_FLUSH_INTERVAL.
+"""
+import os
+import socket
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import zeroconf
+from pychromecast.discovery import CastBrowser, SimpleCastListener
+
+from models.database import session_scope
+from models.users_device import UserDevices
+from services.device_pool import device_pool
+from services.device_registry import device_registry
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PRESENCE_ENABLED = os.getenv("PRESENCE_ENABLED", "true").lower() == "true"
+PRESENCE_PROBE_INTERVAL = int(os.getenv("PRESENCE_PROBE_INTERVAL", 30))
+PRESENCE_PROBE_TIMEOUT = float(os.getenv("PRESENCE_PROBE_TIMEOUT", 2))
+PRESENCE_PROBE_WORKERS = int(os.getenv("PRESENCE_PROBE_WORKERS", 8))
+PRESENCE_FLUSH_INTERVAL = int(os.getenv("PRESENCE_FLUSH_INTERVAL", 60))
+CAST_PORT = 8009
+
+
+def probe(device_name: str, device_ip: str):
+    """True if the device answers on its cast port."""
+    if device_pool.is_connected(device_name, device_ip):
+        return True
+    try:
+        with socket.create_connection((device_ip, CAST_PORT), timeout=PRESENCE_PROBE_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+
+class PresenceTracker:
+
+    def __init__(self):
+        self._devices = {}  # device id -> (name, ip)
+        self._presence = {}  # device id -> presence dict
+        self._dirty = {}  # device id -> last seen, not yet written
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=PRESENCE_PROBE_WORKERS, thread_name_prefix="presence-probe")
+        self._threads = []
+        self._zconf = None
+        self._browser = None
+        self.probes = 0
+        self.flushes = 0
+
+    def get(self, device_id: str):
+        """Presence of a device, or None if it has not been checked yet."""
+        with self._lock:
+            return self._presence.get(str(device_id))
+
+    def _mark(self, device_id: str, present: bool, source: str):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            previous = self._presence.get(device_id) or {}
+            self._presence[device_id] = {
+                "isConnected": present,
+                "lastSeen": now if present else previous.get("lastSeen"),
+                "checkedAt": now,
+                "source": source,
+            }
+            if present:
+                self._dirty[device_id] = now
+
+    def _match(self, cast_info):
+        with self._lock:
+            devices = list(self._devices.items())
+        return [device_id for device_id, (name, ip) in devices
+                if ip == cast_info.host or name == cast_info.friendly_name]
+
+    # --- zeroconf ---
+    def _on_announce(self, uuid, service):
+        cast_info = self._browser.services.get(uuid)
+        if cast_info is None:
+            return
+        for device_id in self._match(cast_info):
+            self._mark(device_id, True, "mdns")
+
+    def _on_remove(self, uuid, service, cast_info):
+        for device_id in self._match(cast_info):
+            self._mark(device_id, False, "mdns")
+
+    # --- probing ---
+    def refresh_devices(self):
+        devices = device_registry.all()
+        with self._lock:
+            self._devices = {str(d.id): (d.device_name, d.ip_address) for d in devices}
+            for device_id in list(self._presence):
+                if device_id not in self._devices:
+                    del self._presence[device_id]
+
+    def probe_device(self, device_id: str):
+        with self._lock:
+            device = self._devices.get(device_id)
+        if device is None:
+            return
+        self._mark(device_id, probe(*device), "probe")
+        with self._lock:
+            self.probes += 1
+
+    def check(self, device_id: str, device_name: str, device_ip: str):
+        """Starts tracking a device the table does not know yet."""
+        with self._lock:
+            self._devices[str(device_id)] = (device_name, device_ip)
+        self._executor.submit(self.probe_device, str(device_id))
+
+    def _probe_loop(self):
+        while True:
+            try:
+                self.refresh_devices()
+                with self._lock:
+                    device_ids = list(self._devices)
+                list(self._executor.map(self.probe_device, device_ids))
+            except Exception as e:
+                logging.error(f"Presence probe failed: {e}")
+            if self._stop.wait(PRESENCE_PROBE_INTERVAL):
+                return
+
+    # --- last_communication ---
+    def flush(self):
+        """Writes pending sightings to user_devices in one transaction."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+
+        try:
+            with session_scope() as session:
+                session.bulk_update_mappings(UserDevices, [{
+                    "id": device_id,
+                    "last_communication": seen
+                } for device_id, seen in dirty.items()])
+            with self._lock:
+                self.flushes += 1
+        except Exception as e:
+            logging.error(f"Failed to write last_communication for {len(dirty)} devices: {e}")
+            with self._lock:
+                for device_id, seen in dirty.items():
+                    self._dirty.setdefault(device_id, seen)
+
+    def _flush_loop(self):
+        while not self._stop.wait(PRESENCE_FLUSH_INTERVAL):
+            self.flush()
+
+    def start(self):
+        if self._threads:
+            return
+        for target, name in ((self._probe_loop, "presence-probe-loop"), (self._flush_loop, "presence-flush")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        try:
+            self._zconf = zeroconf.Zeroconf()
+            self._browser = CastBrowser(SimpleCastListener(self._on_announce, self._on_remove, self._on_announce), self._zconf)
+            self._browser.start_discovery()
+        except Exception as e:
+            # Probing alone still keeps the table current.
+            logging.error(f"Zeroconf presence listener unavailable: {e}")
+
+    def shutdown(self):
+        self._stop.set()
+        if self._browser is not None:
+            self._browser.stop_discovery()
+        if self._zconf is not None:
+            self._zconf.close()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "present": sum(1 for p in self._presence.values() if p["isConnected"]),
+                "probes": self.probes,
+                "flushes": self.flushes,
+                "pendingWrites": len(self._dirty),
+                "mdns": self._browser is not None,
+            }
+
+
+presence_tracker = PresenceTracker()
@@ -0,0 +1,113 @@
+"""Deadlines for timed playback stops, kept on a single thread.
+
+Each device has at most one pending stop. The deadlines sit in a heap
+watched by one timer thread, so any number of timed jobs costs one thread,
+and a deadline can be cancelled or moved when other media takes over the
+device. Cancelled and moved entries are left in the heap and skipped when
+they come up.
+"""
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class StopScheduler:
+
+    def __init__(self):
+        self._heap = []  # (deadline, seq, key)
+        self._pending = {}  # key -> (deadline, seq, callback)
+        self._seq = itertools.count()
+        self._changed = threading.Condition()
+        self._thread = None
+        self.fired = 0
+        self.cancelled = 0
+        self.rescheduled = 0
+
+    def schedule(self, key, delay: float, callback):
+        """Runs callback() in `delay` seconds, replacing any pending stop for key."""
+        with self._changed:
+            if key in self._pending:
+                self.cancelled += 1
+            self._push(key, time.monotonic() + delay, callback)
+            self._start()
+
+    def reschedule(self, key, delay: float):
+        """Moves the pending stop for key; False if there is none."""
+        with self._changed:
+            entry = self._pending.get(key)
+            if entry is None:
+                return False
+            self._push(key, time.monotonic() + delay, entry[2])
+            self.rescheduled += 1
+            return True
+
+    def cancel(self, key):
+        """Drops the pending stop for key; False if there is none."""
+        with self._changed:
+            if self._pending.pop(key, None) is None:
+                return False
+            self.cancelled += 1
+            return True
+
+    def remaining(self, key):
+        """Seconds until the pending stop for key, or None."""
+        with self._changed:
+            entry = self._pending.get(key)
+            return max(entry[0] - time.monotonic(), 0.0) if entry else None
+
+    def _push(self, key, deadline: float, callback):
+        seq = next(self._seq)
+        self._pending[key] = (deadline, seq, callback)
+        heapq.heappush(self._heap, (deadline, seq, key))
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [(d, s, k) for k, (d, s, _) in self._pending.items()]
+            heapq.heapify(self._heap)
+        self._changed.notify()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stop-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while True:
+                    # Skip entries that were cancelled or moved.
+                    while self._heap and self._pending.get(self._heap[0][2], (None, None))[1] != self._heap[0][1]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._changed.wait()
+                        continue
+                    deadline, _, key = self._heap[0]
+                    delay = deadline - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._changed.wait(delay)
+                heapq.heappop(self._heap)
+                _, _, callback = self._pending.pop(key)
+                self.fired += 1
+
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Scheduled stop for {key} failed: {e}")
+
+    def stats(self):
+        with self._changed:
+            now = time.monotonic()
+            return {
+                "pending": len(self._pending),
+                "nextInSeconds": round(min(d for d, _, _ in self._pending.values()) - now, 1) if self._pending else None,
+                "fired": self.fired,
+                "cancelled": self.cancelled,
+                "rescheduled": self.rescheduled,
+            }
+
+
+stop_scheduler = StopScheduler()
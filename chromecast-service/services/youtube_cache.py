@@ -0,0 +1,162 @@
+"""Cache of resolved YouTube audio streams, keyed by video id.
+
+Resolving a video (watch page, player JS, stream manifest) takes seconds,
+while the resulting googlevideo URL stays valid for hours and carries its
+own expiry in the `expire` query parameter. Entries are reused until shortly
+before that expiry, and upcoming videos can be resolved ahead of time.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from pytubefix import YouTube
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+YOUTUBE_CACHE_SIZE = int(os.getenv("YOUTUBE_CACHE_SIZE", 256))
+# Entries are dropped this long before the stream URL expires, so a clip
+# that starts from the cache can still play for a while.
+YOUTUBE_EXPIRY_MARGIN = int(os.getenv("YOUTUBE_EXPIRY_MARGIN", 1800))
+# Used when a stream URL does not say when it expires.
+YOUTUBE_DEFAULT_TTL = int(os.getenv("YOUTUBE_DEFAULT_TTL", 3600))
+YOUTUBE_PREFETCH_WORKERS = int(os.getenv("YOUTUBE_PREFETCH_WORKERS", 2))
+# How long a caller waits for another thread resolving the same video.
+YOUTUBE_RESOLVE_WAIT = float(os.getenv("YOUTUBE_RESOLVE_WAIT", 60))
+
+
+def video_id(youtube_url: str):
+    """Video id of a watch, youtu.be, shorts or embed URL (else the URL)."""
+    parts = urlsplit(youtube_url)
+    host = parts.netloc.lower()
+    if host.endswith("youtu.be"):
+        return parts.path.strip("/").split("/")[0] or youtube_url
+    query = parse_qs(parts.query)
+    if "v" in query:
+        return query["v"][0]
+    segments = [s for s in parts.path.split("/") if s]
+    if len(segments) >= 2 and segments[0] in ("shorts", "embed", "live", "v"):
+        return segments[1]
+    return youtube_url
+
+
+def stream_expiry(stream_url: str, now: float):
+    """Unix time at which a googlevideo stream URL stops working."""
+    try:
+        return float(parse_qs(urlsplit(stream_url).query)["expire"][0])
+    except (KeyError, IndexError, ValueError):
+        return now + YOUTUBE_DEFAULT_TTL
+
+
+class YouTubeStreamCache:
+
+    def __init__(self, capacity: int = YOUTUBE_CACHE_SIZE):
+        self.capacity = capacity
+        self._streams = OrderedDict()  # video id -> (stream url, title, content type, expires at)
+        self._resolving = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=YOUTUBE_PREFETCH_WORKERS, thread_name_prefix="youtube-prefetch")
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.resolves = 0
+        self.wait_timeouts = 0
+        self.resolve_seconds_total = 0.0
+
+    def _cached(self, key: str):
+        with self._lock:
+            entry = self._streams.get(key)
+            if entry is None:
+                return None
+            if entry[3] - YOUTUBE_EXPIRY_MARGIN <= time.time():
+                del self._streams[key]
+                self.expired += 1
+                return None
+            self._streams.move_to_end(key)
+            return entry[:3]
+
+    def resolve(self, youtube_url: str):
+        """Returns (stream url, title, content type) for the video."""
+        key = video_id(youtube_url)
+        cached = self._cached(key)
+        if cached:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        with self._lock:
+            self.misses += 1
+            pending = self._resolving.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._resolving[key] = threading.Event()
+
+        if not owner:
+            # Another thread (e.g. a prefetch) is resolving the same video.
+            if not pending.wait(YOUTUBE_RESOLVE_WAIT):
+                with self._lock:
+                    self.wait_timeouts += 1
+                raise Exception(f"Timed out waiting for YouTube video {key} to resolve.")
+            cached = self._cached(key)
+            if cached:
+                return cached
+            return self._resolve(key, youtube_url)
+
+        try:
+            return self._resolve(key, youtube_url)
+        finally:
+            with self._lock:
+                self._resolving.pop(key, None)
+            pending.set()
+
+    def _resolve(self, key: str, youtube_url: str):
+        started = time.monotonic()
+        yt = YouTube(youtube_url)
+        audio_streams = yt.streams.filter(only_audio=True)
+        # Cast devices play AAC in MP4 everywhere; WebM/Opus only on some.
+        audio_stream = audio_streams.filter(subtype="mp4").first() or audio_streams.first()
+        if not audio_stream:
+            raise Exception("No audio stream found for the YouTube URL.")
+
+        entry = (audio_stream.url, yt.title, audio_stream.mime_type or "audio/mp4",
+                 stream_expiry(audio_stream.url, time.time()))
+        with self._lock:
+            self.resolves += 1
+            self.resolve_seconds_total += time.monotonic() - started
+            self._streams[key] = entry
+            self._streams.move_to_end(key)
+            while len(self._streams) > self.capacity:
+                self._streams.popitem(last=False)
+        logging.info(f"Resolved YouTube video {key} in {time.monotonic() - started:.2f}s.")
+        return entry[:3]
+
+    def prefetch(self, youtube_urls: list):
+        """Resolves videos in the background so their playback starts at once."""
+        for youtube_url in youtube_urls:
+            self._executor.submit(self._prefetch, youtube_url)
+
+    def _prefetch(self, youtube_url: str):
+        try:
+            self.resolve(youtube_url)
+        except Exception as e:
+            logging.error(f"Failed to prefetch YouTube URL {youtube_url}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._streams),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "resolves": self.resolves,
+                "waitTimeouts": self.wait_timeouts,
+                "resolveSecondsAvg": self.resolve_seconds_total / self.resolves if self.resolves else None,
+            }
+
+
+youtube_cache = YouTubeStreamCache()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import modules the way app.py does, from the service root.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Importing media_cache must not create or clean a cache directory.
+os.environ.setdefault("MEDIA_CACHE_ENABLED", "false")
@@ -0,0 +1,169 @@
+import time
+import threading
+
+import pytest
+
+from services import dispatcher as dispatcher_module
+from services.dispatcher import Dispatcher, QueueFull, coalesce_key
+
+DEVICE = {"device_name": "living room", "device_ip": "10.0.0.2"}
+
+
+def wait_idle(dispatcher, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = dispatcher.stats()
+        if stats["queued"] == 0 and stats["active"] == 0:
+            return
+        time.sleep(0.01)
+    raise AssertionError("dispatcher did not drain")
+
+
+class Recorder:
+    """Handler that blocks on the job named "gate" until released."""
+
+    def __init__(self):
+        self.ran = []
+        self.gate = threading.Event()
+
+    def __call__(self, job):
+        if job["name"] == "gate":
+            self.gate.wait(2)
+        self.ran.append(job["name"])
+        return {"status": "success"}
+
+
+def job(name, priority=None, **fields):
+    job = {**DEVICE, "action_type": "TTS", "media_url": f"http://media/{name}.mp3", "name": name}
+    if priority is not None:
+        job["priority"] = priority
+    job.update(fields)
+    return job
+
+
+def start_gated(recorder):
+    dispatcher = Dispatcher(recorder)
+    dispatcher.put(job("gate"))
+    time.sleep(0.05)  # let the gate job start so later jobs queue behind it
+    return dispatcher
+
+
+def test_runs_higher_priority_first_and_fifo_within_a_priority():
+    recorder = Recorder()
+    dispatcher = start_gated(recorder)
+    dispatcher.put(job("low", 0))
+    dispatcher.put(job("normal-1", 5))
+    dispatcher.put(job("high", 10))
+    dispatcher.put(job("normal-2", 5))
+    recorder.gate.set()
+    wait_idle(dispatcher)
+
+    assert recorder.ran == ["gate", "high", "normal-1", "normal-2", "low"]
+
+
+def test_lanes_of_different_devices_run_in_parallel():
+    recorder = Recorder()
+    dispatcher = start_gated(recorder)
+    other = job("other")
+    other["device_name"] = "kitchen"
+    dispatcher.put(other)
+    time.sleep(0.1)
+
+    assert recorder.ran == ["other"]
+    recorder.gate.set()
+    wait_idle(dispatcher)
+
+
+def test_duplicate_waiting_job_is_coalesced_and_takes_the_higher_priority():
+    recorder = Recorder()
+    dispatcher = start_gated(recorder)
+    first = job("clip", 0)
+    dispatcher.put(first)
+    dispatcher.put(job("other", 5))
+    queued = dispatcher.put(job("clip", 10))
+    recorder.gate.set()
+    wait_idle(dispatcher)
+
+    assert queued is first
+    assert first["priority"] == 10
+    assert recorder.ran == ["gate", "clip", "other"]
+    assert dispatcher.stats()["lanes"][0]["coalesced"] == 1
+
+
+def test_coalesce_key_tells_different_media_apart():
+    assert coalesce_key(job("a")) == coalesce_key(job("a", 10))
+    assert coalesce_key(job("a")) != coalesce_key(job("b"))
+    assert coalesce_key(job("a", action_type="QUEUE")) != coalesce_key(job("a"))
+
+
+def test_put_raises_queue_full_at_lane_depth():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, max_lane_depth=2)
+    dispatcher.put(job("gate"))
+    time.sleep(0.05)
+    dispatcher.put(job("one"))
+    dispatcher.put(job("two"))
+    with pytest.raises(QueueFull):
+        dispatcher.put(job("three"))
+    recorder.gate.set()
+    wait_idle(dispatcher)
+
+    assert dispatcher.stats()["rejected"] == 1
+    assert recorder.ran == ["gate", "one", "two"]
+
+
+def test_put_raises_queue_full_at_total_bound():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, max_queued=1)
+    dispatcher.put(job("gate"))
+    time.sleep(0.05)
+    dispatcher.put(job("one"))
+    other = job("other")
+    other["device_name"] = "kitchen"
+    with pytest.raises(QueueFull):
+        dispatcher.put(other)
+    recorder.gate.set()
+    wait_idle(dispatcher)
+
+
+def test_held_job_starts_once_can_start_allows_it(monkeypatch):
+    monkeypatch.setattr(dispatcher_module, "DISPATCH_HOLD_RETRY_SECONDS", 0.02)
+    recorder = Recorder()
+    allowed = threading.Event()
+    dispatcher = Dispatcher(recorder, can_start=lambda job: allowed.is_set())
+    dispatcher.put(job("held"))
+    time.sleep(0.1)
+
+    assert recorder.ran == []
+    allowed.set()
+    wait_idle(dispatcher)
+    assert recorder.ran == ["held"]
+    assert dispatcher.stats()["lanes"][0]["held"] >= 1
+
+
+def test_claimed_lane_runs_nothing_until_released():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder)
+    claim = dispatcher.claim(job("claim", action_type="BROADCAST"))
+    assert claim["claim"].wait(1)
+
+    dispatcher.put(job("after"))
+    time.sleep(0.1)
+    assert recorder.ran == []
+
+    dispatcher.release(claim)
+    wait_idle(dispatcher)
+    assert recorder.ran == ["after"]
+
+
+def test_withdrawn_claim_is_skipped():
+    recorder = Recorder()
+    dispatcher = start_gated(recorder)
+    claim = dispatcher.claim(job("claim", action_type="BROADCAST"))
+    dispatcher.put(job("after"))
+    dispatcher.release(claim)
+    recorder.gate.set()
+    wait_idle(dispatcher)
+
+    assert not claim["claim"].is_set()
+    assert recorder.ran == ["gate", "after"]
@@ -0,0 +1,19 @@
+from services.media_cache import cache_key
+
+
+def test_presign_parameters_are_ignored():
+    first = "http://minio:9000/bucket/abc/tts.mp3?X-Amz-Algorithm=AWS4&X-Amz-Signature=1&X-Amz-Date=20240101"
+    second = "http://minio:9000/bucket/abc/tts.mp3?X-Amz-Signature=2&X-Amz-Expires=900"
+
+    assert cache_key(first) == cache_key(second)
+    assert cache_key(first) == cache_key("http://minio:9000/bucket/abc/tts.mp3")
+
+
+def test_other_query_parameters_tell_media_apart():
+    assert cache_key("http://host/play.mp3?id=1") != cache_key("http://host/play.mp3?id=2")
+    assert cache_key("http://host/play.mp3?id=1&X-Amz-Signature=a") == cache_key("http://host/play.mp3?id=1")
+
+
+def test_host_and_path_are_part_of_the_key():
+    assert cache_key("http://a/clip.mp3") != cache_key("http://b/clip.mp3")
+    assert cache_key("http://a/one.mp3") != cache_key("http://a/two.mp3")
@@ -0,0 +1,90 @@
+import time
+import threading
+
+from services.stop_scheduler import StopScheduler
+
+
+class Fired:
+
+    def __init__(self):
+        self.keys = []
+        self.event = threading.Event()
+
+    def callback(self, key):
+        def fire():
+            self.keys.append(key)
+            self.event.set()
+        return fire
+
+
+def test_fires_in_deadline_order():
+    scheduler = StopScheduler()
+    fired = Fired()
+    scheduler.schedule("late", 0.15, fired.callback("late"))
+    scheduler.schedule("early", 0.05, fired.callback("early"))
+    time.sleep(0.3)
+
+    assert fired.keys == ["early", "late"]
+    assert scheduler.stats()["fired"] == 2
+    assert scheduler.stats()["pending"] == 0
+
+
+def test_cancelled_stop_does_not_fire():
+    scheduler = StopScheduler()
+    fired = Fired()
+    scheduler.schedule("device", 0.05, fired.callback("device"))
+
+    assert scheduler.cancel("device")
+    assert not scheduler.cancel("device")
+    time.sleep(0.15)
+    assert fired.keys == []
+    assert scheduler.stats()["cancelled"] == 1
+
+
+def test_reschedule_moves_the_deadline():
+    scheduler = StopScheduler()
+    fired = Fired()
+    scheduler.schedule("device", 0.05, fired.callback("device"))
+
+    assert scheduler.reschedule("device", 0.3)
+    time.sleep(0.15)
+    assert fired.keys == []
+    assert 0 < scheduler.remaining("device") <= 0.3
+    assert fired.event.wait(1)
+    assert fired.keys == ["device"]
+
+
+def test_reschedule_without_pending_stop():
+    assert not StopScheduler().reschedule("device", 1)
+
+
+def test_scheduling_again_replaces_the_pending_stop():
+    scheduler = StopScheduler()
+    fired = Fired()
+    scheduler.schedule("device", 0.05, fired.callback("first"))
+    scheduler.schedule("device", 0.1, fired.callback("second"))
+    time.sleep(0.25)
+
+    assert fired.keys == ["second"]
+
+
+def test_remaining_and_pending_count():
+    scheduler = StopScheduler()
+    scheduler.schedule("a", 10, lambda: None)
+    scheduler.schedule("b", 20, lambda: None)
+
+    assert scheduler.remaining("missing") is None
+    assert 9 < scheduler.remaining("a") <= 10
+    assert scheduler.stats()["pending"] == 2
+
+
+def test_failing_callback_does_not_stop_the_scheduler():
+    scheduler = StopScheduler()
+    fired = Fired()
+
+    def fail():
+        raise RuntimeError("device gone")
+
+    scheduler.schedule("broken", 0.01, fail)
+    scheduler.schedule("ok", 0.05, fired.callback("ok"))
+    assert fired.event.wait(1)
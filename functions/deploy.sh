@@ -11,6 +11,7 @@ mkdir -p deploy
 cd deploy
 
 cp ../app.py .
+cp ../storage.py .
 cp ../requirements.txt .
 pip install -r requirements.txt -t .
 
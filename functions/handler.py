@@ -1,6 +1,5 @@
 import json
 
-from botocore import endpoint
 from botocore.exceptions import NoCredentialsError
 from botocore.session import PartialCredentialsError
 import pychromecast
@@ -10,26 +9,20 @@ from pychromecast.controllers.receiver import CastStatus, CastStatusListener
 from dotenv import load_dotenv
 import os
 
-import socket
+import io
 from gtts import gTTS
 import threading
 
-import boto3
+import storage
 
 load_dotenv()
 
 def upload_file_to_s3(file_name, bucket_name, object_name=None):
-    s3_client = boto3.client('s3',
-                             endpoint_url='http://192.168.7.13:9000',
-                             aws_access_key_id='minioadmin',
-                             aws_secret_access_key='minioadmin',
-                             region_name='us-east-1',
-                             use_ssl=False)
     if object_name is None:
         object_name = file_name
 
     try:
-        s3_client.upload_file(file_name, bucket_name, object_name)
+        storage.upload_file(file_name, bucket_name, object_name)
         print(f"'{file_name}' has been uploaded to '{bucket_name}/{object_name}'.")
         return True
     except FileNotFoundError:
@@ -42,27 +35,24 @@ def upload_file_to_s3(file_name, bucket_name, object_name=None):
         print("Incomplete AWS credentials.")
         return False
 
-def generate_presigned_url(bucket_name, object_name, expiration=3600, method="get"):
-    s3_client = boto3.client('s3',
-                             endpoint_url='http://192.168.7.13:9000',
-                             aws_access_key_id='minioadmin',
-                             aws_secret_access_key='minioadmin',
-                             region_name='us-east-1',
-                             use_ssl=False)
+def upload_bytes_to_s3(data, bucket_name, object_name, content_type=None):
+    try:
+        storage.upload_bytes(data, bucket_name, object_name, content_type)
+        print(f"{len(data)} bytes have been uploaded to '{bucket_name}/{object_name}'.")
+        return True
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete.")
+        return False
+    except Exception as e:
+        print(f"Error uploading to S3: {e}")
+        return False
 
+def generate_presigned_url(bucket_name, object_name, expiration=3600, method="get"):
     try:
         if method.lower() == "get":
-            response = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': bucket_name, 'Key': object_name},
-                ExpiresIn=expiration
-            )
+            response = storage.presigned_get_url(bucket_name, object_name, expiration)
         elif method.lower() == "put":
-            response = s3_client.generate_presigned_url(
-                'put_object',
-                Params={'Bucket': bucket_name, 'Key': object_name},
-                ExpiresIn=expiration
-            )
+            response = storage.presigned_put_url(bucket_name, object_name, expiration)
         else:
             raise ValueError("Invalid method. Use 'get' or 'put'.")
         return response
@@ -127,14 +117,14 @@ def commandToDevice(text: str, volume: float, lang: str):
     cast = casts[0]
     cast.wait()
 
-    fname = '/tmp/tts.mp3'
+    buf = io.BytesIO()
     tts = gTTS(text, lang=lang, slow=True)
-    tts.save(fname)
+    tts.write_to_fp(buf)
 
     bucket_name = 'vtlr-tts'
     object_name = 'tts.mp3'
 
-    success = upload_file_to_s3(fname, bucket_name, object_name)
+    success = upload_bytes_to_s3(buf.getvalue(), bucket_name, object_name, 'audio/mpeg')
     if success:
         print("file upload successful.")
     else:
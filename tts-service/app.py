@@ -2,14 +2,21 @@ from flask import Flask
 from flask_cors import CORS
 
 from routes import tts_routes
+from services.melo_backend import melo_backend, MELO_ENABLED
+from services.speech_service import bucket_lifecycle
+from services.lifecycle_service import LIFECYCLE_ENABLED
 
-import sys
-from pathlib import Path
+import atexit
 
-#from melo.api import TTS
+# Load the offline model into its process pool before taking traffic.
+if MELO_ENABLED:
+  melo_backend.start()
+  atexit.register(melo_backend.shutdown)
 
-submodule_path = Path(__file__).resolve().parent / "external/melo"
-sys.path.append(str(submodule_path))
+# Keep the speech bucket within its byte budget.
+if LIFECYCLE_ENABLED:
+  bucket_lifecycle.start()
+  atexit.register(bucket_lifecycle.shutdown)
 
 app = Flask(__name__)
 CORS(app)
@@ -0,0 +1,80 @@
+"""Compare per-call boto3 clients against the pooled storage client.
+
+Runs the HEAD + presign + upload sequence that one speech request performs,
+once with a freshly built client per call (the previous behaviour) and once
+through services.storage, and prints per-request latency percentiles.
+
+Requires a reachable bucket configured through the usual STORAGE_* variables.
+
+  python -m bench.bench_storage --bucket vtlr-dev-tts-speech --requests 200
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+from bench.stats import summarize
+from services import storage
+
+
+def one_request(get_client, bucket_name: str, payload: bytes):
+  object_name = os.path.join('bench', str(uuid.uuid4()), 'tts.mp3')
+
+  client = get_client()
+  try:
+    client.head_object(Bucket=bucket_name, Key=object_name)
+  except client.exceptions.ClientError:
+    pass
+
+  client = get_client()
+  client.put_object(Bucket=bucket_name, Key=object_name, Body=payload)
+
+  client = get_client()
+  client.generate_presigned_url('get_object',
+                                Params={
+                                    'Bucket': bucket_name,
+                                    'Key': object_name
+                                },
+                                ExpiresIn=3600)
+  return object_name
+
+
+def run(get_client, bucket_name: str, requests: int, payload: bytes):
+  samples = []
+  written = []
+  for _ in range(requests):
+    started = time.perf_counter()
+    written.append(one_request(get_client, bucket_name, payload))
+    samples.append(time.perf_counter() - started)
+
+  client = storage.get_client()
+  for i in range(0, len(written), 1000):
+    client.delete_objects(Bucket=bucket_name,
+                          Delete={
+                              'Objects': [{
+                                  'Key': key
+                              } for key in written[i:i + 1000]]
+                          })
+  return summarize(samples)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--bucket', default='vtlr-dev-tts-speech')
+  parser.add_argument('--requests', type=int, default=100)
+  parser.add_argument('--payload-kb', type=int, default=48)
+  args = parser.parse_args()
+
+  payload = os.urandom(args.payload_kb * 1024)
+  results = {
+      'perCallClient': run(storage.create_client, args.bucket, args.requests,
+                           payload),
+      'pooledClient': run(storage.get_client, args.bucket, args.requests,
+                          payload),
+  }
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,138 @@
+"""Latency/throughput benchmark for the speech endpoint, fully offline.
+
+Drives tts_routes.make_speech through the Flask test client, and the bare
+generate_tts + upload chain, against fake TextToSpeech and S3 clients.
+Results are written as JSON so runs can be compared between releases.
+
+  python -m bench.bench_tts --requests 200 --clients 8 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from bench.fakes import FakeS3Client, FakeTextToSpeechClient
+from bench.stats import summarize
+from services import storage, tts_service
+from services.cache_service import tts_cache
+from services.file_service import presigned_url_cache, upload_bytes_to_s3
+
+SHORT_TEXT = "좋은 아침입니다. 오늘 오전 9시에 회의가 있습니다."
+LONG_TEXT = " ".join([
+    "오늘의 브리핑을 시작하겠습니다.", "서울의 낮 최고 기온은 24도, 오후에는 구름이 많겠습니다.",
+    "오전 10시에는 주간 회의가 있고, 오후 2시에는 병원 예약이 있습니다.",
+    "저녁에는 분리수거를 잊지 마세요."
+] * 10)
+
+
+def reset_caches():
+  tts_cache.clear()
+  presigned_url_cache.clear()
+
+
+def timed(fn, *args):
+  started = time.perf_counter()
+  fn(*args)
+  return time.perf_counter() - started
+
+
+def run(fn, payloads, clients: int):
+  started = time.perf_counter()
+  if clients == 1:
+    samples = [timed(fn, p) for p in payloads]
+  else:
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+      samples = list(pool.map(lambda p: timed(fn, p), payloads))
+  return summarize(samples, time.perf_counter() - started)
+
+
+def make_speech_caller(client):
+
+  def call(payload):
+    response = client.post('/v1.0/tts/', json=payload)
+    if response.status_code != 201:
+      raise RuntimeError(f"make_speech failed: {response.get_json()}")
+
+  return call
+
+
+def render_chain(payload):
+  audio, _ = tts_service.generate_tts("google", payload["text"],
+                                      'ko-KR-Chirp3-HD-Charon', {}, "mp3")
+  upload_bytes_to_s3(audio, 'bench', f"{uuid.uuid4()}/tts.mp3", 'audio/mpeg')
+
+
+def unique(text: str, count: int):
+  return [{"text": f"{text} ({uuid.uuid4()})"} for _ in range(count)]
+
+
+def git_revision():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                   stderr=subprocess.DEVNULL).decode().strip()
+  except Exception:
+    return None
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--requests', type=int, default=100)
+  parser.add_argument('--clients', type=int, default=8)
+  parser.add_argument('--synth-latency', type=float, default=0.15)
+  parser.add_argument('--storage-latency', type=float, default=0.005)
+  parser.add_argument('--output', default='bench-results.json')
+  args = parser.parse_args()
+
+  fake_tts = FakeTextToSpeechClient(base_latency=args.synth_latency)
+  tts_service._tts_client = fake_tts
+  storage._client = FakeS3Client(latency=args.storage_latency)
+
+  from app import app
+  client = app.test_client()
+  make_speech = make_speech_caller(client)
+  n = args.requests
+
+  scenarios = {}
+
+  reset_caches()
+  scenarios['coldCache'] = run(make_speech, unique(SHORT_TEXT, n), 1)
+
+  reset_caches()
+  warm = unique(SHORT_TEXT, 10)
+  for payload in warm:
+    make_speech(payload)
+  scenarios['warmCache'] = run(make_speech, (warm * n)[:n], 1)
+
+  reset_caches()
+  scenarios['longTextCold'] = run(make_speech,
+                                  unique(LONG_TEXT, max(n // 10, 1)), 1)
+
+  reset_caches()
+  scenarios['concurrentCold'] = run(make_speech, unique(SHORT_TEXT, n),
+                                    args.clients)
+  scenarios['concurrentWarm'] = run(make_speech, (warm * n)[:n],
+                                    args.clients)
+
+  scenarios['renderChain'] = run(render_chain, unique(SHORT_TEXT, n), 1)
+
+  results = {
+      'timestamp': datetime.now(timezone.utc).isoformat(),
+      'revision': git_revision(),
+      'python': platform.python_version(),
+      'parameters': vars(args),
+      'providerCalls': fake_tts.calls,
+      'scenarios': scenarios,
+  }
+  with open(args.output, 'w') as f:
+    json.dump(results, f, indent=2)
+  print(json.dumps(scenarios, indent=2))
+  print(f"Results written to {os.path.abspath(args.output)}")
+
+
+if __name__ == '__main__':
+  main()
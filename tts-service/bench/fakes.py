@@ -0,0 +1,125 @@
+"""Offline stand-ins for the TextToSpeech API and the S3 bucket.
+
+They implement just the calls tts-service makes, with a configurable delay
+so the benchmark exercises our own code paths without network access.
+"""
+import io
+import time
+import wave
+import threading
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+from google.cloud import texttospeech
+
+# One silent MPEG-2 Layer III frame, 32 kbit/s at 16 kHz (576 samples).
+MP3_FRAME = bytes([0xFF, 0xF3, 0x48, 0xC4]) + bytes(140)
+MP3_FRAME_SECONDS = 576 / 16000
+
+
+class FakeTextToSpeechClient:
+  """Answers synthesize_speech after `base_latency + per_char * len(text)`."""
+
+  def __init__(self, base_latency: float = 0.15, per_char: float = 0.0005,
+               sample_rate: int = 16000):
+    self.base_latency = base_latency
+    self.per_char = per_char
+    self.sample_rate = sample_rate
+    self.calls = 0
+    self._lock = threading.Lock()
+
+  def synthesize_speech(self, input, voice, audio_config):
+    with self._lock:
+      self.calls += 1
+    text = input.text
+    time.sleep(self.base_latency + self.per_char * len(text))
+
+    # Roughly 12 characters per second of speech.
+    seconds = max(len(text) / 12, 0.5)
+    if audio_config.audio_encoding == texttospeech.AudioEncoding.LINEAR16:
+      audio = self._wav(seconds)
+    else:
+      audio = MP3_FRAME * int(seconds / MP3_FRAME_SECONDS)
+    return SimpleNamespace(audio_content=audio)
+
+  def list_voices(self, language_code=None):
+    voice = SimpleNamespace(name='ko-KR-Chirp3-HD-Charon',
+                            ssml_gender=texttospeech.SsmlVoiceGender.MALE,
+                            language_codes=['ko-KR'])
+    return SimpleNamespace(voices=[voice])
+
+  def _wav(self, seconds: float):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+      w.setnchannels(1)
+      w.setsampwidth(2)
+      w.setframerate(self.sample_rate)
+      w.writeframes(bytes(int(seconds * self.sample_rate) * 2))
+    return buf.getvalue()
+
+
+class FakeS3Client:
+  """In-memory bucket with a fixed per-call latency."""
+
+  def __init__(self, latency: float = 0.005):
+    self.latency = latency
+    self.objects = {}
+    self._lock = threading.Lock()
+
+  def _wait(self):
+    time.sleep(self.latency)
+
+  def head_object(self, Bucket, Key):
+    self._wait()
+    with self._lock:
+      obj = self.objects.get((Bucket, Key))
+    if obj is None:
+      raise ClientError({'Error': {
+          'Code': '404',
+          'Message': 'Not Found'
+      }}, 'HeadObject')
+    return {
+        'ContentLength': len(obj['Body']),
+        'ContentType': obj.get('ContentType'),
+        'Metadata': obj.get('Metadata', {}),
+    }
+
+  def get_object(self, Bucket, Key):
+    self._wait()
+    with self._lock:
+      obj = self.objects.get((Bucket, Key))
+    if obj is None:
+      raise ClientError({'Error': {
+          'Code': 'NoSuchKey',
+          'Message': 'Not Found'
+      }}, 'GetObject')
+    return {'Body': io.BytesIO(obj['Body']), 'Metadata': obj.get('Metadata', {})}
+
+  def put_object(self, Bucket, Key, Body, **kwargs):
+    self._wait()
+    with self._lock:
+      self.objects[(Bucket, Key)] = {'Body': bytes(Body), **kwargs}
+    return {}
+
+  def copy_object(self, Bucket, Key, CopySource, Metadata=None, **kwargs):
+    self._wait()
+    with self._lock:
+      obj = self.objects.get((CopySource['Bucket'], CopySource['Key']))
+      if obj is None:
+        raise ClientError({'Error': {
+            'Code': 'NoSuchKey',
+            'Message': 'Not Found'
+        }}, 'CopyObject')
+      self.objects[(Bucket, Key)] = {**obj, 'Metadata': Metadata or {}}
+    return {}
+
+  def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+    self.put_object(Bucket, Key, Fileobj.read(), **(ExtraArgs or {}))
+
+  def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None):
+    with open(Filename, 'rb') as f:
+      self.upload_fileobj(f, Bucket, Key, ExtraArgs, Config)
+
+  def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+    return (f"http://bench.local/{Params['Bucket']}/{Params['Key']}"
+            f"?X-Amz-Expires={ExpiresIn}")
@@ -0,0 +1,21 @@
+import statistics
+
+
+def percentile(samples, pct):
+  ordered = sorted(samples)
+  index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+  return ordered[index]
+
+
+def summarize(samples, elapsed: float = None):
+  """Latency percentiles in ms; throughput when wall time is given."""
+  summary = {
+      'requests': len(samples),
+      'meanMs': statistics.mean(samples) * 1000,
+      'p50Ms': percentile(samples, 50) * 1000,
+      'p95Ms': percentile(samples, 95) * 1000,
+      'p99Ms': percentile(samples, 99) * 1000,
+  }
+  if elapsed:
+    summary['throughputRps'] = len(samples) / elapsed
+  return summary
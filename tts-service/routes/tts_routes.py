@@ -1,10 +1,15 @@
-from flask import Blueprint, request, jsonify
-import uuid
-import os
+from flask import Blueprint, request, jsonify, make_response
 import logging
 
-from services.file_service import check_file_exist_s3, upload_file_to_s3, generate_presigned_url
-from services.tts_service import generate_tts, get_available_speakers
+from services.cache_service import tts_cache
+from services.file_service import presigned_url_cache
+from services.speech_service import (parse_speech_request, render_speech,
+                                     render_speech_batch, SpeechError,
+                                     BATCH_MAX_ITEMS, bucket_lifecycle)
+from services.template_service import (parse_template_request,
+                                      render_template, segment_cache)
+from services.melo_backend import melo_backend
+from services.speaker_service import speaker_catalogue, make_etag
 
 bp = Blueprint('tts', __name__, url_prefix='/v1.0/tts')
 
@@ -21,69 +26,112 @@ def hello():
 # Make new speech
 @bp.route('/', methods=['POST'])
 def make_speech():
-  data = request.get_json()
-  if not data or not data.get("text"):
-    return jsonify({"error": "text field is required"}), 400
+  try:
+    speech = parse_speech_request(request.get_json())
+  except ValueError as e:
+    return jsonify({"error": str(e)}), 400
 
-  text = data["text"]
-  language = data.get("language", "ko")
-  speaker = data.get("speaker")
+  try:
+    result = render_speech(speech)
+  except SpeechError as e:
+    return jsonify({"status": "error", "message": str(e)}), 500
 
-  playId = str(uuid.uuid4())
-  logger.info(f"Handling speech request (playId: {playId}, text: '{text}')")
+  return jsonify({"status": "success", "data": result}), 201
 
-  bucket_name = 'vtlr-dev-tts-speech'
-  object_name = os.path.join(playId, 'tts.wav')
 
-  presigned_url = None
-  if check_file_exist_s3(bucket_name, object_name):
-    logger.info(
-        f"File already exists for playId {playId}. Generating new presigned URL."
-    )
-    presigned_url = generate_presigned_url(bucket_name, object_name)
-  else:
-    if not speaker:
-      speaker = 'ko-KR-Chirp3-HD-Charon'
-
-    logger.info(f"Creating TTS with speaker: {speaker}")
-    audio_config = {"pitch": 0, "bass": 0, "treble": 0, "reverb": 0}
-    filepath = generate_tts("google", text, speaker, audio_config)
-
-    if not filepath:
-      return jsonify({
-          "status": "error",
-          "message": "Failed to generate TTS file."
-      }), 500
-
-    logger.info(f"Uploading TTS to S3 object: {object_name}")
-    success = upload_file_to_s3(filepath, bucket_name, object_name)
-
-    if success:
-      logger.info("File upload successful. Generating presigned URL.")
-      presigned_url = generate_presigned_url(bucket_name, object_name)
-    else:
-      return jsonify({
-          "status": "error",
-          "message": "Failed to upload TTS file to storage."
-      }), 500
-
-  if not presigned_url:
+# Make speech from a template and slot values
+@bp.route('/template', methods=['POST'])
+def make_template_speech():
+  try:
+    speech, texts = parse_template_request(request.get_json())
+  except ValueError as e:
+    return jsonify({"error": str(e)}), 400
+
+  try:
+    result = render_template(speech, texts)
+  except SpeechError as e:
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+  return jsonify({"status": "success", "data": result}), 201
+
+
+# Make many speeches at once
+@bp.route('/batch', methods=['POST'])
+def make_speech_batch():
+  data = request.get_json()
+  items = data.get("items") if isinstance(data, dict) else None
+  if not isinstance(items, list) or not items:
+    return jsonify({"error": "items field must be a non-empty list"}), 400
+  if len(items) > BATCH_MAX_ITEMS:
+    return jsonify(
+        {"error": f"items must not exceed {BATCH_MAX_ITEMS} entries"}), 400
+
+  results = render_speech_batch(items)
+  return jsonify({"status": "success", "data": results}), 201
+
+
+# Cache statistics
+@bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+  stats = tts_cache.stats()
+  stats["presignedUrls"] = presigned_url_cache.stats()
+  stats["templateSegments"] = segment_cache.stats()
+  return jsonify({"status": "success", "data": stats}), 200
+
+
+# Bucket occupancy and eviction statistics
+@bp.route('/admin/bucket', methods=['GET'])
+def get_bucket_stats():
+  return jsonify({"status": "success", "data": bucket_lifecycle.stats()}), 200
+
+
+# Run an eviction sweep now
+@bp.route('/admin/bucket/sweep', methods=['POST'])
+def sweep_bucket():
+  try:
+    report = bucket_lifecycle.sweep()
+  except Exception as e:
+    logger.error(f"Bucket sweep failed: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+  if report is None:
     return jsonify({
         "status": "error",
-        "message": "Failed to generate presigned URL."
-    }), 500
+        "message": "A sweep is already running."
+    }), 409
+  return jsonify({"status": "success", "data": report}), 200
 
+
+# Synthesis engines
+@bp.route('/engines', methods=['GET'])
+def get_engines():
   return jsonify({
       "status": "success",
       "data": {
-          "playId": playId,
-          "presignedUrl": presigned_url
+          "google": {
+              "enabled": True
+          },
+          "melo": melo_backend.stats()
       }
-  }), 201
+  }), 200
 
 
 # Get available speakers
 @bp.route('/speakers', methods=['GET'])
 def get_speakers():
-  speakers = get_available_speakers()
-  return jsonify({"status": "success", "data": speakers}), 200
+  language = request.args.get("language", "ko-KR")
+  gender = request.args.get("gender")
+  speakers = speaker_catalogue.find(None if language == "all" else language,
+                                    gender)
+
+  etag = make_etag(speakers)
+  if request.if_none_match.contains(etag):
+    response = make_response("", 304)
+  else:
+    response = make_response(
+        jsonify({
+            "status": "success",
+            "data": speakers
+        }), 200)
+  response.set_etag(etag)
+  return response
@@ -0,0 +1,147 @@
+"""Single-pass post-processing for synthesized speech.
+
+Voice effects, the background bed (trim, volume, mix) and the final encode
+are expressed as one ffmpeg filter graph, so an announcement costs a single
+process spawn no matter how many effects are enabled. The voice is fed as
+WAV through stdin and the encoded clip is read back from stdout.
+"""
+import os
+import math
+import hashlib
+import threading
+import subprocess
+import logging
+
+from services.audio_info import wav_duration, wav_sample_rate
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKGROUND_DIR = os.getenv('TTS_BACKGROUND_DIR',
+                           os.path.join(os.path.dirname(__file__), '..',
+                                        'assets', 'backgrounds'))
+BED_CACHE_DIR = os.getenv('TTS_BED_CACHE_DIR', '/tmp/vtlr-tts-beds')
+
+# Pre-trimmed beds are cut in multiples of this many seconds so clips of
+# similar length share one cached bed.
+BED_QUANTUM_SECONDS = int(os.getenv('TTS_BED_QUANTUM_SECONDS', 30))
+
+DEFAULT_BG_VOLUME = 0.5
+DEFAULT_BG_START = 10
+
+_bed_locks = {}
+_bed_locks_guard = threading.Lock()
+
+
+def voice_filters(audio_config, input_rate: int, sample_rate: int):
+  """Effect filters for a voice recorded at `input_rate`.
+
+  Pitch-shifted voices come out at `sample_rate`; others keep their rate
+  until the final -ar.
+  """
+  filters = []
+
+  pitch = audio_config.get("pitch", 0)
+  if pitch:
+    # Pitch in cents like sox: resample to shift, re-time to keep duration.
+    factor = 2**(pitch / 1200)
+    filters += [
+        f"asetrate={input_rate * factor:.2f}", f"aresample={sample_rate}",
+        f"atempo={1 / factor:.6f}"
+    ]
+  if audio_config.get("bass", 0):
+    filters.append(f"bass=g={audio_config['bass']}")
+  if audio_config.get("treble", 0):
+    filters.append(f"treble=g={audio_config['treble']}")
+  if audio_config.get("reverb", 0):
+    decay = min(max(audio_config["reverb"], 0), 100) / 100 * 0.5
+    filters.append(f"aecho=0.8:0.9:60|120:{decay:.3f}|{decay / 2:.3f}")
+
+  if filters:
+    filters.append("volume=1.2")
+  return filters
+
+
+def background_path(name: str):
+  # Only bare file names are accepted; beds live in BACKGROUND_DIR.
+  path = os.path.join(BACKGROUND_DIR, os.path.basename(name))
+  if not os.path.isfile(path):
+    raise FileNotFoundError(f"Background '{name}' not found.")
+  return path
+
+
+def trimmed_bed(name: str, start: float, duration: float, sample_rate: int):
+  """Return a cached WAV of the bed from `start`, at least `duration` long."""
+  length = math.ceil(duration / BED_QUANTUM_SECONDS) * BED_QUANTUM_SECONDS
+  source = background_path(name)
+  digest = hashlib.sha1(
+      f"{source}:{os.path.getmtime(source)}:{start}:{length}:{sample_rate}".
+      encode('utf-8')).hexdigest()
+  bed = os.path.join(BED_CACHE_DIR, f"{digest}.wav")
+  if os.path.isfile(bed):
+    return bed
+
+  with _bed_locks_guard:
+    lock = _bed_locks.setdefault(digest, threading.Lock())
+  with lock:
+    if os.path.isfile(bed):
+      return bed
+
+    os.makedirs(BED_CACHE_DIR, exist_ok=True)
+    partial = f"{bed}.{os.getpid()}.{threading.get_ident()}.tmp"
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-ss",
+        str(start), "-t",
+        str(length), "-i", source, "-ar",
+        str(sample_rate), "-ac", "1", "-c:a", "pcm_s16le", "-f", "wav", "-y",
+        partial
+    ]
+    subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                   check=True)
+    os.replace(partial, bed)
+    logger.info(f"Cached trimmed background bed '{name}' ({length}s).")
+    return bed
+
+
+def build_command(audio_config, duration: float, input_rate: int,
+                  sample_rate: int, output_args):
+  cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0"]
+  graph = []
+  voice = voice_filters(audio_config, input_rate, sample_rate)
+
+  background = audio_config.get("background")
+  if background:
+    bed = trimmed_bed(background,
+                      audio_config.get("bg_start", DEFAULT_BG_START),
+                      duration, sample_rate)
+    cmd += ["-i", bed]
+    graph.append(f"[0:a]{','.join(voice) or 'anull'}[voice]")
+    graph.append(
+        f"[1:a]atrim=end={duration:.3f},asetpts=PTS-STARTPTS,"
+        f"volume={audio_config.get('bg_volume', DEFAULT_BG_VOLUME)}[bed]")
+    graph.append("[voice][bed]amix=inputs=2:duration=first:normalize=0[out]")
+  else:
+    graph.append(f"[0:a]{','.join(voice) or 'anull'}[out]")
+
+  cmd += ["-filter_complex", ";".join(graph), "-map", "[out]", "-ar",
+          str(sample_rate), "-ac", "1"] + output_args + ["pipe:1"]
+  return cmd
+
+
+def render(wav: bytes, audio_config, sample_rate: int, output_args):
+  """Apply effects and background to a WAV voice and encode it in one pass.
+
+  The voice may come at any rate (melo uses the model's native one);
+  `sample_rate` is the rate of the encoded clip.
+
+  Returns (encoded bytes, duration in seconds).
+  """
+  duration = wav_duration(wav)
+  cmd = build_command(audio_config or {}, duration, wav_sample_rate(wav),
+                      sample_rate, output_args)
+  result = subprocess.run(cmd,
+                          input=wav,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE,
+                          check=True)
+  return result.stdout, duration
@@ -0,0 +1,89 @@
+"""Clip durations read from the encoded bytes themselves.
+
+Each format carries enough information to compute its length without
+decoding or spawning a probe: the WAV header, the MP3 frame headers, or the
+granule position of the last Ogg page.
+"""
+import io
+import struct
+import wave
+
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],  # MPEG-2.5
+}
+
+OPUS_GRANULE_RATE = 48000
+
+
+def wav_duration(data: bytes):
+  with wave.open(io.BytesIO(data)) as w:
+    return w.getnframes() / float(w.getframerate())
+
+
+def wav_sample_rate(data: bytes):
+  with wave.open(io.BytesIO(data)) as w:
+    return w.getframerate()
+
+
+def mp3_duration(data: bytes):
+  """Sum the samples of every MPEG Layer III frame."""
+  pos = 0
+  if data[:3] == b'ID3' and len(data) >= 10:
+    size = data[6] << 21 | data[7] << 14 | data[8] << 7 | data[9]
+    pos = 10 + size
+
+  duration = 0.0
+  end = len(data) - 4
+  while pos <= end:
+    header = struct.unpack('>I', data[pos:pos + 4])[0]
+    version = (header >> 19) & 0x3
+    layer = (header >> 17) & 0x3
+    bitrate_index = (header >> 12) & 0xF
+    rate_index = (header >> 10) & 0x3
+    if ((header >> 21) & 0x7FF != 0x7FF or version == 1 or layer != 1 or
+        bitrate_index in (0, 15) or rate_index == 3):
+      pos += 1
+      continue
+
+    bitrate = MP3_BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (header >> 9) & 0x1
+    if version == 3:
+      samples, frame_length = 1152, 144 * bitrate // sample_rate + padding
+    else:
+      samples, frame_length = 576, 72 * bitrate // sample_rate + padding
+
+    duration += samples / sample_rate
+    pos += frame_length
+  return duration
+
+
+def ogg_opus_duration(data: bytes):
+  """Granule position of the last page, minus the encoder pre-skip."""
+  last = data.rfind(b'OggS')
+  if last < 0 or len(data) < last + 14:
+    return 0.0
+  granule = struct.unpack('<q', data[last + 6:last + 14])[0]
+
+  pre_skip = 0
+  head = data.find(b'OpusHead')
+  if head >= 0 and len(data) >= head + 12:
+    pre_skip = struct.unpack('<H', data[head + 10:head + 12])[0]
+  return max(granule - pre_skip, 0) / OPUS_GRANULE_RATE
+
+
+DURATION_READERS = {
+    'mp3': mp3_duration,
+    'ogg': ogg_opus_duration,
+    'wav': wav_duration,
+}
+
+
+def audio_duration(data: bytes, output_format: str):
+  return DURATION_READERS[output_format](data)
@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+import threading
+import unicodedata
+import logging
+from collections import OrderedDict
+
+from services.file_service import get_object_metadata_s3
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_INDEX_SIZE = int(os.getenv('TTS_CACHE_INDEX_SIZE', 1024))
+
+
+def normalize_text(text: str):
+  """Normalize text so trivially different inputs share one cache entry."""
+  text = unicodedata.normalize('NFC', text)
+  return ' '.join(text.split())
+
+
+def make_cache_key(text: str,
+                   speaker: str,
+                   language: str,
+                   audio_config,
+                   output_format: str = None,
+                   sample_rate: int = None,
+                   voice: str = "google"):
+  """Content address of a rendered clip."""
+  payload = json.dumps(
+      {
+          'text': normalize_text(text),
+          'voice': voice,
+          'speaker': speaker,
+          'language': language,
+          'audio_config': audio_config or {},
+          'format': output_format,
+          'sample_rate': sample_rate,
+      },
+      sort_keys=True,
+      ensure_ascii=False)
+  return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+  """In-process LRU index of clips known to exist in object storage.
+
+  Entries in the index are served without touching storage at all; on an
+  index miss the bucket is asked once (HEAD) and the answer is remembered.
+  Each entry keeps the clip's object metadata (e.g. its duration).
+  """
+
+  def __init__(self, capacity: int = CACHE_INDEX_SIZE):
+    self.capacity = capacity
+    self._index = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.storage_hits = 0
+    self.misses = 0
+
+  def lookup(self, key: str, bucket_name: str, object_name: str):
+    """Return the metadata of a stored clip, or None if it must be rendered."""
+    with self._lock:
+      if key in self._index:
+        self._index.move_to_end(key)
+        self.hits += 1
+        return self._index[key]
+
+    metadata = get_object_metadata_s3(bucket_name, object_name)
+    if metadata is not None:
+      self.add(key, metadata)
+      with self._lock:
+        self.storage_hits += 1
+      return metadata
+
+    with self._lock:
+      self.misses += 1
+    return None
+
+  def add(self, key: str, metadata: dict = None):
+    with self._lock:
+      self._index[key] = metadata or {}
+      self._index.move_to_end(key)
+      while len(self._index) > self.capacity:
+        self._index.popitem(last=False)
+
+  def discard(self, key: str):
+    with self._lock:
+      self._index.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._index.clear()
+      self.hits = self.storage_hits = self.misses = 0
+
+  def stats(self):
+    with self._lock:
+      lookups = self.hits + self.storage_hits + self.misses
+      return {
+          'size': len(self._index),
+          'capacity': self.capacity,
+          'hits': self.hits,
+          'storageHits': self.storage_hits,
+          'misses': self.misses,
+          'hitRatio': (self.hits + self.storage_hits) / lookups
+                      if lookups else 0.0,
+      }
+
+
+tts_cache = TTSCache()
@@ -1,38 +1,88 @@
-import os
-import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 from botocore.session import PartialCredentialsError
+from collections import OrderedDict
+import os
+import time
+import threading
 import logging
 
-from dotenv import load_dotenv
-
-load_dotenv()
+from services import storage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-storage_host = os.getenv('STORAGE_HOST')
-storage_port = os.getenv('STORAGE_PORT')
-storage_bucket_name = os.getenv('STORAGE_BUCKET_NAME')
-storage_access_key = os.getenv('STORAGE_ACCESS_KEY')
-storage_secret_key = os.getenv('STORAGE_SECRET_KEY')
+# Presigned URL lifetimes per use case.
+PRESIGN_EXPIRY_ANNOUNCEMENT = int(os.getenv('PRESIGN_EXPIRY_ANNOUNCEMENT', 900))
+PRESIGN_EXPIRY_ASSET = int(os.getenv('PRESIGN_EXPIRY_ASSET', 86400))
+
+# A cached URL is handed out again only while at least this share of its
+# lifetime (and never less than PRESIGN_MIN_REMAINING seconds) is left.
+PRESIGN_REFRESH_RATIO = float(os.getenv('PRESIGN_REFRESH_RATIO', 0.5))
+PRESIGN_MIN_REMAINING = int(os.getenv('PRESIGN_MIN_REMAINING', 60))
+PRESIGN_CACHE_SIZE = int(os.getenv('PRESIGN_CACHE_SIZE', 4096))
+
+
+class PresignedUrlCache:
+  """Bounded LRU of signed GET URLs keyed by bucket, object and lifetime."""
+
+  def __init__(self, capacity: int = PRESIGN_CACHE_SIZE):
+    self.capacity = capacity
+    self._urls = OrderedDict()
+    self._lock = threading.Lock()
+    self.reused = 0
+    self.signed = 0
+
+  def get(self, bucket_name: str, object_name: str, expiration: int):
+    key = (bucket_name, object_name, expiration)
+    min_remaining = max(expiration * PRESIGN_REFRESH_RATIO,
+                        PRESIGN_MIN_REMAINING)
+    with self._lock:
+      entry = self._urls.get(key)
+      if entry and entry[1] - time.time() >= min_remaining:
+        self._urls.move_to_end(key)
+        self.reused += 1
+        return entry[0]
+    return None
+
+  def put(self, bucket_name: str, object_name: str, expiration: int,
+          url: str, signed_at: float):
+    with self._lock:
+      self._urls[(bucket_name, object_name, expiration)] = (url, signed_at +
+                                                            expiration)
+      self._urls.move_to_end((bucket_name, object_name, expiration))
+      self.signed += 1
+      while len(self._urls) > self.capacity:
+        self._urls.popitem(last=False)
+
+  def invalidate(self, bucket_name: str, object_name: str):
+    with self._lock:
+      for key in [k for k in self._urls if k[:2] == (bucket_name, object_name)]:
+        del self._urls[key]
+
+  def clear(self):
+    with self._lock:
+      self._urls.clear()
+      self.reused = self.signed = 0
+
+  def stats(self):
+    with self._lock:
+      return {
+          'size': len(self._urls),
+          'capacity': self.capacity,
+          'reused': self.reused,
+          'signed': self.signed,
+      }
 
 
-def get_s3_client():
-  return boto3.client('s3',
-                      endpoint_url=f'http://{storage_host}:{storage_port}',
-                      aws_access_key_id=storage_access_key,
-                      aws_secret_access_key=storage_secret_key,
-                      use_ssl=False)
+presigned_url_cache = PresignedUrlCache()
 
 
 def upload_file_to_s3(file_name: str, bucket_name: str, object_name: str):
-  s3_client = get_s3_client()
   if object_name is None:
     object_name = file_name
 
   try:
-    s3_client.upload_file(file_name, bucket_name, object_name)
+    storage.upload_file(file_name, bucket_name, object_name)
     logger.info(
         f"'{file_name}' has been uploaded to '{bucket_name}/{object_name}'.")
     return True
@@ -47,37 +97,103 @@ def upload_file_to_s3(file_name: str, bucket_name: str, object_name: str):
     return False
 
 
+def upload_bytes_to_s3(data: bytes,
+                       bucket_name: str,
+                       object_name: str,
+                       content_type: str = None,
+                       metadata: dict = None):
+  """Upload an in-memory payload without staging it on disk."""
+  try:
+    storage.upload_bytes(data, bucket_name, object_name, content_type,
+                         metadata)
+    logger.info(
+        f"{len(data)} bytes have been uploaded to '{bucket_name}/{object_name}'.")
+    return True
+  except (NoCredentialsError, PartialCredentialsError):
+    logger.error("AWS credentials not found or are incomplete.")
+    return False
+  except Exception as e:
+    logger.error(f"An unexpected error occurred during S3 upload: {e}")
+    return False
+
+
+def download_bytes_from_s3(bucket_name: str, object_name: str):
+  """Read a whole object into memory, or None if it cannot be read."""
+  try:
+    return storage.download_bytes(bucket_name, object_name)
+  except ClientError as e:
+    if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+      logger.error(f"A client error occurred: {e}")
+    return None
+  except Exception as e:
+    logger.error(f"An unexpected error occurred during S3 download: {e}")
+    return None
+
+
+def touch_object_s3(bucket_name: str,
+                    object_name: str,
+                    metadata: dict,
+                    content_type: str = None):
+  """Mark an object as recently used.
+
+  Returns False only when the object no longer exists; other failures are
+  logged and treated as success so serving is never blocked on a touch.
+  """
+  try:
+    storage.replace_metadata(bucket_name, object_name, metadata, content_type)
+    return True
+  except ClientError as e:
+    if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+      logger.info(
+          f"Object '{object_name}' does not exist in bucket '{bucket_name}'")
+      return False
+    logger.error(f"A client error occurred: {e}")
+    return True
+  except Exception as e:
+    logger.error(f"An unexpected error occurred touching object: {e}")
+    return True
+
+
 def check_file_exist_s3(bucket_name: str, object_name: str):
-  s3_client = get_s3_client()
+  return get_object_metadata_s3(bucket_name, object_name) is not None
+
+
+def get_object_metadata_s3(bucket_name: str, object_name: str):
+  """User metadata of an object, or None if it does not exist."""
   try:
-    s3_client.head_object(Bucket=bucket_name, Key=object_name)
+    response = storage.head_object(bucket_name, object_name)
     logger.info(f"Object '{object_name}' exists in bucket '{bucket_name}'")
-    return True
+    return response.get('Metadata', {})
   except ClientError as e:
     if e.response['Error']['Code'] == '404':
       logger.info(
           f"Object '{object_name}' does not exist in bucket '{bucket_name}'")
-      return False
+      return None
     else:
       logger.error(f"A client error occurred: {e}")
-      return False  # Assume non-existence on other errors
+      return None  # Assume non-existence on other errors
   except Exception as e:
     logger.error(f"An unexpected error occurred checking file existence: {e}")
-    return False
+    return None
 
 
 def generate_presigned_url(bucket_name: str,
                            object_name: str,
-                           expiration: int = 3600):
-  """Generate a presigned URL to share an S3 object."""
-  s3_client = get_s3_client()
+                           expiration: int = PRESIGN_EXPIRY_ANNOUNCEMENT):
+  """Generate a presigned URL to share an S3 object.
+
+  A URL signed earlier for the same object and lifetime is returned instead
+  while enough of its validity remains.
+  """
+  cached = presigned_url_cache.get(bucket_name, object_name, expiration)
+  if cached:
+    return cached
+
   try:
-    response = s3_client.generate_presigned_url('get_object',
-                                                Params={
-                                                    'Bucket': bucket_name,
-                                                    'Key': object_name
-                                                },
-                                                ExpiresIn=expiration)
+    signed_at = time.time()
+    response = storage.presigned_get_url(bucket_name, object_name, expiration)
+    presigned_url_cache.put(bucket_name, object_name, expiration, response,
+                            signed_at)
     logger.info(f"Generated presigned URL for {object_name}")
     return response
   except (NoCredentialsError, PartialCredentialsError):
@@ -0,0 +1,236 @@
+"""Keeps the speech bucket bounded by treating it as a cache.
+
+S3 has no access time, so a served clip is "touched" by copying it onto
+itself, which refreshes LastModified; this happens at most once per
+TOUCH_INTERVAL per clip and process. A background sweeper then lists the
+bucket page by page and deletes, in bounded batches, clips unused for longer
+than BUCKET_TTL and, while the bucket is above BUCKET_MAX_BYTES, the least
+recently used ones. Clips used within BUCKET_MIN_AGE are never evicted, and
+while the sweeper is enabled no URL may outlive that window (MAX_URL_EXPIRY),
+so every URL handed out stays playable.
+
+Every gunicorn worker runs a sweeper thread; a file lock lets only one of
+them sweep at a time, and the result of the last sweep is shared through a
+state file so any worker can report it.
+"""
+import os
+import json
+import time
+import fcntl
+import threading
+import logging
+from collections import OrderedDict
+
+from services import storage
+from services.file_service import (touch_object_s3, presigned_url_cache,
+                                   PRESIGN_EXPIRY_ASSET,
+                                   PRESIGN_EXPIRY_ANNOUNCEMENT)
+from services.cache_service import tts_cache, CACHE_INDEX_SIZE
+from services.tts_service import OUTPUT_FORMATS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LIFECYCLE_ENABLED = os.getenv('TTS_LIFECYCLE_ENABLED',
+                              'true').lower() == 'true'
+BUCKET_MAX_BYTES = int(os.getenv('TTS_BUCKET_MAX_BYTES', 5 * 1024**3))
+BUCKET_TTL = int(os.getenv('TTS_BUCKET_TTL', 30 * 86400))
+TOUCH_INTERVAL = int(os.getenv('TTS_BUCKET_TOUCH_INTERVAL', 6 * 3600))
+BUCKET_MIN_AGE = int(
+    os.getenv('TTS_BUCKET_MIN_AGE', TOUCH_INTERVAL + PRESIGN_EXPIRY_ASSET))
+# A clip's last touch can precede the URL by up to TOUCH_INTERVAL.
+MAX_URL_EXPIRY = BUCKET_MIN_AGE - TOUCH_INTERVAL
+if LIFECYCLE_ENABLED and MAX_URL_EXPIRY < max(PRESIGN_EXPIRY_ANNOUNCEMENT, 60):
+  raise ValueError(
+      "TTS_BUCKET_MIN_AGE must exceed TTS_BUCKET_TOUCH_INTERVAL by at least "
+      f"PRESIGN_EXPIRY_ANNOUNCEMENT ({PRESIGN_EXPIRY_ANNOUNCEMENT}s); got "
+      f"{BUCKET_MIN_AGE}s and {TOUCH_INTERVAL}s")
+SWEEP_INTERVAL = int(os.getenv('TTS_BUCKET_SWEEP_INTERVAL', 3600))
+LIST_PAGE_SIZE = int(os.getenv('TTS_BUCKET_LIST_PAGE_SIZE', 1000))
+DELETE_BATCH_SIZE = min(int(os.getenv('TTS_BUCKET_DELETE_BATCH_SIZE', 500)),
+                        1000)
+LOCK_FILE = os.getenv('TTS_LIFECYCLE_LOCK_FILE', '/tmp/vtlr-tts-lifecycle.lock')
+STATE_FILE = os.getenv('TTS_LIFECYCLE_STATE_FILE',
+                       '/tmp/vtlr-tts-lifecycle.json')
+
+CONTENT_TYPES = {
+    fmt['extension']: fmt['content_type'] for fmt in OUTPUT_FORMATS.values()
+}
+
+
+def select_evictions(objects, now: float, max_bytes: int, ttl: int,
+                     min_age: int):
+  """Split listed objects into the (expired, over budget) ones to delete.
+
+  `objects` are (key, size, last_used) tuples.
+  """
+  expired = []
+  kept = []
+  for obj in objects:
+    if now - obj[2] >= ttl:
+      expired.append(obj)
+    else:
+      kept.append(obj)
+
+  over_budget = []
+  remaining = sum(obj[1] for obj in kept)
+  for obj in sorted(kept, key=lambda o: o[2]):
+    if remaining <= max_bytes or now - obj[2] < min_age:
+      break
+    over_budget.append(obj)
+    remaining -= obj[1]
+  return expired, over_budget
+
+
+class BucketLifecycle:
+  """Access tracking and background eviction for one bucket."""
+
+  def __init__(self, bucket_name: str):
+    self.bucket_name = bucket_name
+    self._touched = OrderedDict()
+    self._lock = threading.Lock()
+    self._stop = threading.Event()
+    self._thread = None
+    self.touches = 0
+    self.missing = 0
+
+  def touch(self, object_name: str, metadata: dict):
+    """Record a use of a clip; False means it has been evicted meanwhile."""
+    now = time.monotonic()
+    with self._lock:
+      touched_at = self._touched.get(object_name)
+      if touched_at is not None and now - touched_at < TOUCH_INTERVAL:
+        return True
+
+    content_type = CONTENT_TYPES.get(object_name.rsplit('.', 1)[-1])
+    exists = touch_object_s3(self.bucket_name, object_name, metadata,
+                             content_type)
+    if exists:
+      self.record_use(object_name)
+    with self._lock:
+      if exists:
+        self.touches += 1
+      else:
+        self.missing += 1
+        self._touched.pop(object_name, None)
+    return exists
+
+  def record_use(self, object_name: str):
+    """Note that storage already saw a fresh write of `object_name`."""
+    with self._lock:
+      self._touched[object_name] = time.monotonic()
+      self._touched.move_to_end(object_name)
+      while len(self._touched) > CACHE_INDEX_SIZE:
+        self._touched.popitem(last=False)
+
+  def start(self):
+    if self._thread is not None:
+      return
+    self._thread = threading.Thread(target=self._run,
+                                    name='bucket-sweeper',
+                                    daemon=True)
+    self._thread.start()
+
+  def shutdown(self):
+    self._stop.set()
+
+  def _run(self):
+    while not self._stop.wait(SWEEP_INTERVAL):
+      last = self._read_state().get('finishedAt', 0)
+      if time.time() - last < SWEEP_INTERVAL / 2:
+        continue
+      try:
+        self.sweep()
+      except Exception as e:
+        logger.error(f"Bucket sweep failed: {e}")
+
+  def sweep(self):
+    """Evict what the policy allows; returns the sweep report or None when
+    another worker is already sweeping."""
+    with open(LOCK_FILE, 'w') as lock:
+      try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except BlockingIOError:
+        return None
+      return self._sweep()
+
+  def _sweep(self):
+    started = time.time()
+    objects = [(o['Key'], o['Size'], o['LastModified'].timestamp())
+               for o in storage.list_objects(self.bucket_name, LIST_PAGE_SIZE)]
+    expired, over_budget = select_evictions(objects, started,
+                                            BUCKET_MAX_BYTES, BUCKET_TTL,
+                                            BUCKET_MIN_AGE)
+
+    sizes = {key: size for key, size, _ in expired + over_budget}
+    deleted = set()
+    errors = 0
+    candidates = [o[0] for o in expired + over_budget]
+    for i in range(0, len(candidates), DELETE_BATCH_SIZE):
+      batch = candidates[i:i + DELETE_BATCH_SIZE]
+      try:
+        removed = storage.delete_objects(self.bucket_name, batch)
+      except Exception as e:
+        logger.error(f"Failed to delete {len(batch)} objects: {e}")
+        errors += len(batch)
+        continue
+      errors += len(batch) - len(removed)
+      deleted.update(removed)
+      for object_name in removed:
+        self.forget(object_name)
+
+    state = self._read_state()
+    evicted_bytes = sum(sizes[key] for key in deleted)
+    state.update({
+        'finishedAt': time.time(),
+        'durationSeconds': round(time.time() - started, 3),
+        'objects': len(objects) - len(deleted),
+        'bytes': sum(o[1] for o in objects) - evicted_bytes,
+        'lastEvicted': {
+            'expired': len([o for o in expired if o[0] in deleted]),
+            'overBudget': len([o for o in over_budget if o[0] in deleted]),
+            'bytes': evicted_bytes,
+            'errors': errors,
+        },
+        'totalEvicted': state.get('totalEvicted', 0) + len(deleted),
+        'totalEvictedBytes': state.get('totalEvictedBytes', 0) + evicted_bytes,
+        'sweeps': state.get('sweeps', 0) + 1,
+    })
+    self._write_state(state)
+    logger.info(f"Bucket sweep evicted {len(deleted)} objects "
+                f"({evicted_bytes} bytes) from {self.bucket_name}.")
+    return state
+
+  def forget(self, object_name: str):
+    """Drop in-process references to an evicted clip."""
+    tts_cache.discard(object_name.split('/', 1)[0])
+    presigned_url_cache.invalidate(self.bucket_name, object_name)
+    with self._lock:
+      self._touched.pop(object_name, None)
+
+  def _read_state(self):
+    try:
+      with open(STATE_FILE) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return {}
+
+  def _write_state(self, state):
+    tmp = f"{STATE_FILE}.{os.getpid()}"
+    with open(tmp, 'w') as f:
+      json.dump(state, f)
+    os.replace(tmp, STATE_FILE)
+
+  def stats(self):
+    with self._lock:
+      process = {'touches': self.touches, 'missing': self.missing}
+    return {
+        'bucket': self.bucket_name,
+        'enabled': self._thread is not None,
+        'maxBytes': BUCKET_MAX_BYTES,
+        'ttlSeconds': BUCKET_TTL,
+        'minAgeSeconds': BUCKET_MIN_AGE,
+        'sweepIntervalSeconds': SWEEP_INTERVAL,
+        'lastSweep': self._read_state() or None,
+        'process': process,
+    }
@@ -0,0 +1,128 @@
+"""Offline MeloTTS backend kept warm in a bounded process pool.
+
+Each pool process loads the checkpoint once in its initializer and keeps it
+for its whole life, so a request only pays for inference. The pool is only
+started when MELO_ENABLED is set; the model and its dependencies (see
+requirements.txt.bak and the external/melo submodule) are not needed
+otherwise.
+"""
+import io
+import os
+import sys
+import time
+import wave
+import logging
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MELO_ENABLED = os.getenv('MELO_ENABLED', 'false').lower() == 'true'
+MELO_WORKERS = int(os.getenv('MELO_WORKERS', 1))
+MELO_LANGUAGE = os.getenv('MELO_LANGUAGE', 'KR')
+MELO_DEVICE = os.getenv('MELO_DEVICE', 'cpu')
+MELO_CONFIG_PATH = os.getenv('MELO_CONFIG_PATH',
+                             os.path.join(Path.home(), "config.json"))
+MELO_CKPT_PATH = os.getenv('MELO_CKPT_PATH',
+                           os.path.join(Path.home(), "G.pth"))
+MELO_PATH = str(Path(__file__).resolve().parent.parent / "external/melo")
+
+WARMUP_TEXT = "안녕하세요."
+
+# Per-process state, populated by _init_worker inside each pool process.
+_model = None
+_load_seconds = None
+
+
+def _init_worker():
+  global _model, _load_seconds
+  if MELO_PATH not in sys.path:
+    sys.path.append(MELO_PATH)
+  from melo.api import TTS
+
+  started = time.perf_counter()
+  _model = TTS(language=MELO_LANGUAGE,
+               config_path=MELO_CONFIG_PATH,
+               ckpt_path=MELO_CKPT_PATH,
+               device=MELO_DEVICE)
+  _load_seconds = time.perf_counter() - started
+
+
+def _synthesize(text: str, speaker: str = None):
+  import numpy as np
+
+  spk2id = _model.hps.data.spk2id
+  speaker_id = spk2id[speaker] if speaker in spk2id else next(
+      iter(spk2id.values()))
+  samples = _model.tts_to_file(text, speaker_id, None, quiet=True)
+  pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+  buf = io.BytesIO()
+  with wave.open(buf, 'wb') as w:
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(_model.hps.data.sampling_rate)
+    w.writeframes(pcm.tobytes())
+  return buf.getvalue()
+
+
+def _warmup():
+  started = time.perf_counter()
+  _synthesize(WARMUP_TEXT)
+  return {
+      'pid': os.getpid(),
+      'loadSeconds': _load_seconds,
+      'warmupSeconds': time.perf_counter() - started,
+  }
+
+
+class MeloBackend:
+
+  def __init__(self, workers: int = MELO_WORKERS):
+    self.workers = workers
+    self._executor = None
+    self.warmup_stats = []
+
+  @property
+  def running(self):
+    return self._executor is not None
+
+  def start(self):
+    """Start the pool and load the model in every process up front."""
+    if self.running:
+      return
+    started = time.perf_counter()
+    # spawn: torch does not survive fork after its thread pools start.
+    self._executor = ProcessPoolExecutor(
+        max_workers=self.workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker)
+    futures = [self._executor.submit(_warmup) for _ in range(self.workers)]
+    self.warmup_stats = [f.result() for f in futures]
+    logger.info(
+        f"MeloTTS pool ready with {self.workers} workers in "
+        f"{time.perf_counter() - started:.1f}s: {self.warmup_stats}")
+
+  def synthesize(self, text: str, speaker: str = None):
+    """Render text to WAV bytes on the pool."""
+    if not self.running:
+      raise RuntimeError("MeloTTS backend is not enabled.")
+    return self._executor.submit(_synthesize, text, speaker).result()
+
+  def shutdown(self):
+    if self._executor:
+      self._executor.shutdown(wait=True, cancel_futures=True)
+      self._executor = None
+
+  def stats(self):
+    return {
+        'enabled': MELO_ENABLED,
+        'running': self.running,
+        'workers': self.workers,
+        'warmup': self.warmup_stats,
+    }
+
+
+melo_backend = MeloBackend()
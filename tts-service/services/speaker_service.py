@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+
+from services.tts_service import get_available_speakers
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SPEAKERS_TTL = int(os.getenv('TTS_SPEAKERS_TTL', 3600))
+
+
+class SpeakerCatalogue:
+  """Voice list cached for `ttl` seconds and refreshed in the background.
+
+  Only the very first call waits for `list_voices`; afterwards an expired
+  catalogue keeps being served while a single background thread reloads it.
+  """
+
+  def __init__(self, ttl: int = SPEAKERS_TTL):
+    self.ttl = ttl
+    self._speakers = None
+    self._loaded_at = 0.0
+    self._lock = threading.Lock()
+    self._refreshing = False
+
+  def get(self):
+    with self._lock:
+      speakers = self._speakers
+      expired = time.monotonic() - self._loaded_at >= self.ttl
+      start_refresh = speakers is not None and expired and not self._refreshing
+      if start_refresh:
+        self._refreshing = True
+
+    if speakers is None:
+      return self.refresh()
+
+    if start_refresh:
+      threading.Thread(target=self._refresh_in_background,
+                       name='speaker-refresh',
+                       daemon=True).start()
+    return speakers
+
+  def refresh(self):
+    speakers = get_available_speakers()
+    with self._lock:
+      self._speakers = speakers
+      self._loaded_at = time.monotonic()
+    logger.info(f"Loaded {len(speakers)} speakers into the catalogue.")
+    return speakers
+
+  def _refresh_in_background(self):
+    try:
+      self.refresh()
+    except Exception as e:
+      logger.error(f"Failed to refresh speaker catalogue: {e}")
+    finally:
+      with self._lock:
+        self._refreshing = False
+
+  def find(self, language: str = None, gender: str = None):
+    speakers = self.get()
+    if language:
+      language = language.lower()
+      speakers = [
+          s for s in speakers if any(
+              code.lower() == language or code.lower().startswith(language +
+                                                                  '-')
+              for code in s['languageCodes'])
+      ]
+    if gender:
+      gender = gender.upper()
+      speakers = [s for s in speakers if s['gender'] == gender]
+    return speakers
+
+
+def make_etag(data):
+  payload = json.dumps(data, sort_keys=True, ensure_ascii=False)
+  return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+speaker_catalogue = SpeakerCatalogue()
@@ -0,0 +1,246 @@
+import os
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from services.file_service import (upload_bytes_to_s3, generate_presigned_url,
+                                   PRESIGN_EXPIRY_ANNOUNCEMENT)
+from services.cache_service import make_cache_key, tts_cache
+from services.tts_service import (generate_tts, OUTPUT_FORMATS,
+                                  DEFAULT_OUTPUT_FORMAT, SAMPLE_RATE, VOICES)
+from services.melo_backend import melo_backend
+from services.lifecycle_service import (BucketLifecycle, LIFECYCLE_ENABLED,
+                                        MAX_URL_EXPIRY)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = 'vtlr-dev-tts-speech'
+DEFAULT_SPEAKER = 'ko-KR-Chirp3-HD-Charon'
+
+BATCH_WORKERS = int(os.getenv('TTS_BATCH_WORKERS', 4))
+BATCH_MAX_ITEMS = int(os.getenv('TTS_BATCH_MAX_ITEMS', 100))
+
+# S3 SigV4 caps presigned URLs at seven days; with the bucket sweeper on, a
+# URL must not outlive the window in which its clip is safe from eviction.
+MAX_PRESIGN_EXPIRY = 7 * 24 * 3600
+if LIFECYCLE_ENABLED:
+  MAX_PRESIGN_EXPIRY = min(MAX_PRESIGN_EXPIRY, MAX_URL_EXPIRY)
+
+# Shared by every batch request so concurrent batches cannot multiply the
+# number of in-flight provider calls.
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS,
+                                    thread_name_prefix='tts-batch')
+
+bucket_lifecycle = BucketLifecycle(BUCKET_NAME)
+
+
+class SpeechError(Exception):
+  """Rendering a speech clip failed after the request was validated."""
+
+
+def parse_speech_request(data):
+  """Validate a speech payload and fill in defaults.
+
+  Raises ValueError with a client-facing message on bad input.
+  """
+  if not isinstance(data, dict) or not data.get("text"):
+    raise ValueError("text field is required")
+
+  output_format = data.get("format", DEFAULT_OUTPUT_FORMAT)
+  if output_format not in OUTPUT_FORMATS:
+    raise ValueError(f"format must be one of {', '.join(OUTPUT_FORMATS)}")
+
+  voice = data.get("voice", "google")
+  if voice not in VOICES:
+    raise ValueError(f"voice must be one of {', '.join(VOICES)}")
+  if voice == "melo" and not melo_backend.running:
+    raise ValueError("voice 'melo' is not enabled on this server")
+
+  expires_in = data.get("expiresIn", PRESIGN_EXPIRY_ANNOUNCEMENT)
+  if not isinstance(expires_in, int) or not 60 <= expires_in <= MAX_PRESIGN_EXPIRY:
+    raise ValueError(
+        f"expiresIn must be an integer between 60 and {MAX_PRESIGN_EXPIRY}")
+
+  return {
+      "text": data["text"],
+      "voice": voice,
+      "language": data.get("language", "ko"),
+      "speaker": data.get("speaker") or
+                 (DEFAULT_SPEAKER if voice == "google" else None),
+      "audio_config": parse_audio_config(data.get("audioConfig") or {}),
+      "format": output_format,
+      "expires_in": expires_in,
+  }
+
+
+def parse_audio_config(audio_config):
+  if not isinstance(audio_config, dict):
+    raise ValueError("audioConfig must be an object")
+
+  parsed = {"pitch": 0, "bass": 0, "treble": 0, "reverb": 0}
+  for key in ("pitch", "bass", "treble", "reverb", "bg_volume", "bg_start"):
+    if key not in audio_config:
+      continue
+    value = audio_config[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+      raise ValueError(f"audioConfig.{key} must be a number")
+    parsed[key] = value
+
+  if not -1200 <= parsed["pitch"] <= 1200:
+    raise ValueError("audioConfig.pitch must be between -1200 and 1200 cents")
+  for key in ("bass", "treble"):
+    if not -20 <= parsed[key] <= 20:
+      raise ValueError(f"audioConfig.{key} must be between -20 and 20 dB")
+  # Below 1 the echo decay rounds to zero, which aecho rejects.
+  if parsed["reverb"] and not 1 <= parsed["reverb"] <= 100:
+    raise ValueError("audioConfig.reverb must be 0 or between 1 and 100")
+  for key in ("bg_volume", "bg_start"):
+    if parsed.get(key, 0) < 0:
+      raise ValueError(f"audioConfig.{key} must not be negative")
+
+  if audio_config.get("background"):
+    if not isinstance(audio_config["background"], str):
+      raise ValueError("audioConfig.background must be a file name")
+    parsed["background"] = audio_config["background"]
+  return parsed
+
+
+def speech_key(speech):
+  return make_cache_key(speech["text"], speech["speaker"], speech["language"],
+                        speech["audio_config"], speech["format"],
+                        SAMPLE_RATE, speech["voice"])
+
+
+def clip_duration(metadata):
+  try:
+    return float(metadata["duration"])
+  except (KeyError, TypeError, ValueError):
+    # Clips stored before durations were recorded.
+    return None
+
+
+def clip_object_name(playId: str, output_format: str):
+  return os.path.join(playId, f"tts.{OUTPUT_FORMATS[output_format]['extension']}")
+
+
+def lookup_clip(playId: str, output_format: str):
+  """Metadata of a stored clip, or None if it must be rendered."""
+  object_name = clip_object_name(playId, output_format)
+  metadata = tts_cache.lookup(playId, BUCKET_NAME, object_name)
+  if metadata is not None and not bucket_lifecycle.touch(
+      object_name, metadata):
+    # Evicted by the sweeper since this process last saw it.
+    tts_cache.discard(playId)
+    return None
+  return metadata
+
+
+def synthesize_clip(speech, playId: str):
+  """Synthesize `speech` and store it under `playId`.
+
+  Returns (audio bytes, object metadata).
+  """
+  logger.info(f"Creating TTS with speaker: {speech['speaker']}")
+  try:
+    audio, duration = generate_tts(speech["voice"], speech["text"],
+                                   speech["speaker"], speech["audio_config"],
+                                   speech["format"])
+  except FileNotFoundError as e:
+    raise SpeechError(str(e))
+  except subprocess.CalledProcessError as e:
+    logger.error(f"ffmpeg failed: {e.stderr.decode('utf-8', 'replace') if e.stderr else e}")
+    raise SpeechError("Failed to process TTS audio.")
+  except Exception as e:
+    # Provider (Google, MeloTTS) errors.
+    logger.error(f"TTS synthesis failed: {e}")
+    raise SpeechError(f"Failed to synthesize speech: {e}")
+  if not audio:
+    raise SpeechError("Failed to generate TTS file.")
+
+  return audio, store_clip(audio, duration, playId, speech["format"])
+
+
+def store_clip(audio: bytes, duration: float, playId: str,
+               output_format: str):
+  # Stored with the object so cache hits know the length without decoding.
+  metadata = {"duration": f"{duration:.3f}"}
+  object_name = clip_object_name(playId, output_format)
+  logger.info(f"Uploading TTS to S3 object: {object_name}")
+  if not upload_bytes_to_s3(audio, BUCKET_NAME, object_name,
+                            OUTPUT_FORMATS[output_format]['content_type'],
+                            metadata):
+    raise SpeechError("Failed to upload TTS file to storage.")
+  tts_cache.add(playId, metadata)
+  bucket_lifecycle.record_use(object_name)
+  return metadata
+
+
+def clip_result(playId: str, output_format: str, metadata, cached: bool,
+                expires_in: int):
+  presigned_url = generate_presigned_url(
+      BUCKET_NAME, clip_object_name(playId, output_format), expires_in)
+  if not presigned_url:
+    raise SpeechError("Failed to generate presigned URL.")
+
+  return {
+      "playId": playId,
+      "presignedUrl": presigned_url,
+      "contentType": OUTPUT_FORMATS[output_format]['content_type'],
+      "duration": clip_duration(metadata),
+      "cached": cached
+  }
+
+
+def render_speech(speech):
+  """Return a playable clip for `speech`, synthesizing it only on a miss."""
+  # Identical announcements map to the same object, so recurring schedules
+  # are synthesized once and served from storage afterwards.
+  playId = speech_key(speech)
+  logger.info(
+      f"Handling speech request (playId: {playId}, text: '{speech['text']}')")
+
+  metadata = lookup_clip(playId, speech["format"])
+  cached = metadata is not None
+  if cached:
+    logger.info(f"Cache hit for playId {playId}. Generating presigned URL.")
+  else:
+    _, metadata = synthesize_clip(speech, playId)
+
+  return clip_result(playId, speech["format"], metadata, cached,
+                     speech["expires_in"])
+
+
+def render_speech_batch(items):
+  """Render many payloads on the shared pool, one result per input item.
+
+  Identical items are rendered once; a failing item is reported in place
+  and does not affect the others.
+  """
+  results = [None] * len(items)
+  pending = {}
+
+  for index, item in enumerate(items):
+    try:
+      speech = parse_speech_request(item)
+    except ValueError as e:
+      results[index] = {"status": "error", "message": str(e)}
+      continue
+
+    key = (speech_key(speech), speech["expires_in"])
+    if key not in pending:
+      pending[key] = (batch_executor.submit(render_speech, speech), [])
+    pending[key][1].append(index)
+
+  for future, indexes in pending.values():
+    try:
+      result = {"status": "success", **future.result()}
+    except SpeechError as e:
+      result = {"status": "error", "message": str(e)}
+    except Exception as e:
+      logger.error(f"An unexpected error occurred rendering batch item: {e}")
+      result = {"status": "error", "message": str(e)}
+    for index in indexes:
+      results[index] = result
+
+  return results
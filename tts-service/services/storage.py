@@ -0,0 +1,181 @@
+"""Pooled S3/MinIO access shared by every service that talks to the bucket.
+
+boto3 clients are thread-safe and expensive to build (credential resolution,
+endpoint model loading, a fresh connection pool), so one client is created
+lazily per process and reused for every upload, HEAD and presign call.
+
+tts-service, worker-service and functions are built from separate Docker
+contexts, so each carries a copy of this module; keep them in sync.
+tts-service's copy also has the download, listing and delete helpers that
+only its caches and bucket sweeper use.
+"""
+import io
+import os
+import threading
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from dotenv import load_dotenv
+
+load_dotenv()
+
+storage_host = os.getenv('STORAGE_HOST')
+storage_port = os.getenv('STORAGE_PORT')
+storage_region = os.getenv('STORAGE_REGION', 'us-east-1')
+storage_access_key = os.getenv('STORAGE_ACCESS_KEY')
+storage_secret_key = os.getenv('STORAGE_SECRET_KEY')
+
+STORAGE_MAX_POOL_CONNECTIONS = int(os.getenv('STORAGE_MAX_POOL_CONNECTIONS',
+                                             32))
+STORAGE_MAX_ATTEMPTS = int(os.getenv('STORAGE_MAX_ATTEMPTS', 3))
+STORAGE_CONNECT_TIMEOUT = float(os.getenv('STORAGE_CONNECT_TIMEOUT', 2))
+STORAGE_READ_TIMEOUT = float(os.getenv('STORAGE_READ_TIMEOUT', 10))
+
+# Clips are small; only switch to multipart for genuinely large payloads.
+MULTIPART_THRESHOLD = int(os.getenv('STORAGE_MULTIPART_THRESHOLD',
+                                    8 * 1024 * 1024))
+MULTIPART_CHUNKSIZE = int(os.getenv('STORAGE_MULTIPART_CHUNKSIZE',
+                                    8 * 1024 * 1024))
+
+_client = None
+_client_lock = threading.Lock()
+
+transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD,
+                                 multipart_chunksize=MULTIPART_CHUNKSIZE,
+                                 max_concurrency=4,
+                                 use_threads=True)
+
+
+def get_client():
+  """Return the process-wide S3 client, creating it on first use."""
+  global _client
+  if _client is None:
+    with _client_lock:
+      if _client is None:
+        _client = create_client()
+  return _client
+
+
+def create_client():
+  config = Config(max_pool_connections=STORAGE_MAX_POOL_CONNECTIONS,
+                  tcp_keepalive=True,
+                  connect_timeout=STORAGE_CONNECT_TIMEOUT,
+                  read_timeout=STORAGE_READ_TIMEOUT,
+                  retries={
+                      'max_attempts': STORAGE_MAX_ATTEMPTS,
+                      'mode': 'standard'
+                  },
+                  signature_version='s3v4')
+  return boto3.session.Session().client(
+      's3',
+      endpoint_url=f'http://{storage_host}:{storage_port}',
+      aws_access_key_id=storage_access_key,
+      aws_secret_access_key=storage_secret_key,
+      region_name=storage_region,
+      use_ssl=False,
+      config=config)
+
+
+def upload_file(file_name: str,
+                bucket_name: str,
+                object_name: str,
+                content_type: str = None):
+  extra_args = {'ContentType': content_type} if content_type else None
+  get_client().upload_file(file_name,
+                           bucket_name,
+                           object_name,
+                           ExtraArgs=extra_args,
+                           Config=transfer_config)
+
+
+def upload_stream(fileobj,
+                  bucket_name: str,
+                  object_name: str,
+                  content_type: str = None,
+                  metadata: dict = None):
+  """Upload from any readable file-like object, multipart when large."""
+  extra_args = {}
+  if content_type:
+    extra_args['ContentType'] = content_type
+  if metadata:
+    extra_args['Metadata'] = metadata
+  get_client().upload_fileobj(fileobj,
+                              bucket_name,
+                              object_name,
+                              ExtraArgs=extra_args or None,
+                              Config=transfer_config)
+
+
+def upload_bytes(data: bytes,
+                 bucket_name: str,
+                 object_name: str,
+                 content_type: str = None,
+                 metadata: dict = None):
+  upload_stream(io.BytesIO(data), bucket_name, object_name, content_type,
+                metadata)
+
+
+def download_bytes(bucket_name: str, object_name: str):
+  response = get_client().get_object(Bucket=bucket_name, Key=object_name)
+  return response['Body'].read()
+
+
+def head_object(bucket_name: str, object_name: str):
+  return get_client().head_object(Bucket=bucket_name, Key=object_name)
+
+
+def replace_metadata(bucket_name: str,
+                     object_name: str,
+                     metadata: dict,
+                     content_type: str = None):
+  """Copy an object onto itself with new metadata, refreshing LastModified."""
+  extra_args = {'ContentType': content_type} if content_type else {}
+  return get_client().copy_object(Bucket=bucket_name,
+                                  Key=object_name,
+                                  CopySource={
+                                      'Bucket': bucket_name,
+                                      'Key': object_name
+                                  },
+                                  Metadata=metadata or {},
+                                  MetadataDirective='REPLACE',
+                                  **extra_args)
+
+
+def list_objects(bucket_name: str, page_size: int = 1000):
+  """Yield every object summary in the bucket, one page at a time."""
+  paginator = get_client().get_paginator('list_objects_v2')
+  for page in paginator.paginate(Bucket=bucket_name,
+                                 PaginationConfig={'PageSize': page_size}):
+    yield from page.get('Contents', [])
+
+
+def delete_objects(bucket_name: str, object_names):
+  """Delete up to 1000 objects in one request; returns the deleted keys."""
+  response = get_client().delete_objects(
+      Bucket=bucket_name,
+      Delete={
+          'Objects': [{
+              'Key': name
+          } for name in object_names],
+          'Quiet': False
+      })
+  return [d['Key'] for d in response.get('Deleted', [])]
+
+
+def presigned_get_url(bucket_name: str, object_name: str, expiration: int):
+  return get_client().generate_presigned_url('get_object',
+                                             Params={
+                                                 'Bucket': bucket_name,
+                                                 'Key': object_name
+                                             },
+                                             ExpiresIn=expiration)
+
+
+def presigned_put_url(bucket_name: str, object_name: str, expiration: int):
+  return get_client().generate_presigned_url('put_object',
+                                             Params={
+                                                 'Bucket': bucket_name,
+                                                 'Key': object_name
+                                             },
+                                             ExpiresIn=expiration)
@@ -0,0 +1,220 @@
+"""Announcements assembled from cached phrase segments.
+
+A template such as "현재 시각은 {hour:hour}시 {minute:minute}분 입니다" is
+split into fixed phrases and typed slots. Every phrase and every slot value
+comes from a small, finite vocabulary, so each one is synthesized once,
+stored like any other clip and kept in memory; a new variant of a known
+template is then just the concatenation of cached MP3 segments and costs no
+provider call.
+"""
+import os
+import re
+import threading
+import logging
+from collections import OrderedDict
+
+from services.file_service import download_bytes_from_s3
+from services.cache_service import make_cache_key
+from services.speech_service import (BUCKET_NAME, parse_speech_request,
+                                     speech_key, clip_object_name, lookup_clip,
+                                     synthesize_clip, store_clip, clip_result,
+                                     clip_duration)
+from services.tts_service import SAMPLE_RATE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEGMENT_CACHE_BYTES = int(os.getenv('TTS_SEGMENT_CACHE_BYTES',
+                                    64 * 1024 * 1024))
+TEMPLATE_NUMBER_MAX = int(os.getenv('TTS_TEMPLATE_NUMBER_MAX', 100))
+
+SLOT_PATTERN = re.compile(r'\{(\w+)(?::(\w+))?\}')
+
+# Hours are read with native Korean numerals ("세 시"), everything else with
+# Sino-Korean ones, which is how the provider reads plain digits.
+NATIVE_HOURS = [
+    "열두", "한", "두", "세", "네", "다섯", "여섯", "일곱", "여덟", "아홉", "열", "열한"
+]
+WEEKDAYS = ["월요일", "화요일", "수요일", "목요일", "금요일", "토요일", "일요일"]
+WEEKDAY_ALIASES = {day[0]: day for day in WEEKDAYS}
+
+
+def hour_text(value):
+  if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 23:
+    raise ValueError("hour slots take an integer between 0 and 23")
+  return NATIVE_HOURS[value % 12]
+
+
+def bounded_number_text(upper: int):
+
+  def to_text(value):
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= upper:
+      raise ValueError(f"number slots take an integer between 0 and {upper}")
+    return str(value)
+
+  return to_text
+
+
+def weekday_text(value):
+  if isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 6:
+    return WEEKDAYS[value]
+  if value in WEEKDAYS:
+    return value
+  if value in WEEKDAY_ALIASES:
+    return WEEKDAY_ALIASES[value]
+  raise ValueError("weekday slots take 0-6 (Monday first) or a Korean weekday")
+
+
+SLOT_TYPES = {
+    'hour': hour_text,
+    'minute': bounded_number_text(59),
+    'number': bounded_number_text(TEMPLATE_NUMBER_MAX),
+    'weekday': weekday_text,
+}
+
+
+def parse_template(template: str):
+  """Split a template into ('text', phrase) and ('slot', name, type) parts."""
+  parts = []
+  pos = 0
+  for match in SLOT_PATTERN.finditer(template):
+    phrase = template[pos:match.start()].strip()
+    if phrase:
+      parts.append(('text', phrase))
+    slot_type = match.group(2) or 'number'
+    if slot_type not in SLOT_TYPES:
+      raise ValueError(f"slot type must be one of {', '.join(SLOT_TYPES)}")
+    parts.append(('slot', match.group(1), slot_type))
+    pos = match.end()
+  phrase = template[pos:].strip()
+  if phrase:
+    parts.append(('text', phrase))
+  return parts
+
+
+def segment_texts(parts, values):
+  texts = []
+  for part in parts:
+    if part[0] == 'text':
+      texts.append(part[1])
+      continue
+    _, name, slot_type = part
+    if name not in values:
+      raise ValueError(f"missing value for slot '{name}'")
+    texts.append(SLOT_TYPES[slot_type](values[name]))
+  return texts
+
+
+class SegmentCache:
+  """Byte-bounded LRU of segment audio, in front of the stored clips."""
+
+  def __init__(self, max_bytes: int = SEGMENT_CACHE_BYTES):
+    self.max_bytes = max_bytes
+    self._segments = OrderedDict()
+    self._bytes = 0
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.storage_hits = 0
+    self.synthesized = 0
+
+  def get(self, key: str):
+    with self._lock:
+      entry = self._segments.get(key)
+      if entry:
+        self._segments.move_to_end(key)
+        self.hits += 1
+      return entry
+
+  def put(self, key: str, audio: bytes, duration: float):
+    with self._lock:
+      if key in self._segments:
+        return
+      self._segments[key] = (audio, duration)
+      self._bytes += len(audio)
+      while self._bytes > self.max_bytes and self._segments:
+        _, (evicted, _) = self._segments.popitem(last=False)
+        self._bytes -= len(evicted)
+
+  def count(self, attribute: str):
+    with self._lock:
+      setattr(self, attribute, getattr(self, attribute) + 1)
+
+  def stats(self):
+    with self._lock:
+      return {
+          'size': len(self._segments),
+          'bytes': self._bytes,
+          'maxBytes': self.max_bytes,
+          'hits': self.hits,
+          'storageHits': self.storage_hits,
+          'synthesized': self.synthesized,
+      }
+
+
+segment_cache = SegmentCache()
+
+
+def load_segment(speech):
+  """Audio and duration of one segment, synthesizing it only once."""
+  playId = speech_key(speech)
+  entry = segment_cache.get(playId)
+  if entry:
+    return entry
+
+  metadata = lookup_clip(playId, speech["format"])
+  audio = None
+  if metadata is not None:
+    audio = download_bytes_from_s3(BUCKET_NAME,
+                                   clip_object_name(playId, speech["format"]))
+
+  if audio is not None:
+    segment_cache.count('storage_hits')
+  else:
+    audio, metadata = synthesize_clip(speech, playId)
+    segment_cache.count('synthesized')
+
+  duration = clip_duration(metadata) or 0.0
+  segment_cache.put(playId, audio, duration)
+  return audio, duration
+
+
+def parse_template_request(data):
+  if not isinstance(data, dict) or not isinstance(data.get("template"), str):
+    raise ValueError("template field is required")
+  values = data.get("values") or {}
+  if not isinstance(values, dict):
+    raise ValueError("values must be an object")
+
+  # Segments are joined frame by frame, which only MP3 supports, and a
+  # background bed would restart at every segment.
+  speech = parse_speech_request({**data, "text": data["template"]})
+  if speech["format"] != "mp3":
+    raise ValueError("templates are only rendered as mp3")
+  if "background" in speech["audio_config"]:
+    raise ValueError("templates do not support a background")
+
+  parts = parse_template(data["template"])
+  texts = segment_texts(parts, values)
+  if not texts:
+    raise ValueError("template renders to empty text")
+  return speech, texts
+
+
+def render_template(speech, texts):
+  """Return a playable clip for a filled-in template."""
+  rendered = " ".join(texts)
+  playId = make_cache_key(f"template:{rendered}", speech["speaker"],
+                          speech["language"], speech["audio_config"],
+                          speech["format"], SAMPLE_RATE, speech["voice"])
+  logger.info(f"Handling template request (playId: {playId}, text: '{rendered}')")
+
+  metadata = lookup_clip(playId, speech["format"])
+  cached = metadata is not None
+  if not cached:
+    segments = [load_segment({**speech, "text": text}) for text in texts]
+    audio = b"".join(segment for segment, _ in segments)
+    duration = sum(d for _, d in segments)
+    metadata = store_clip(audio, duration, playId, speech["format"])
+
+  return clip_result(playId, speech["format"], metadata, cached,
+                     speech["expires_in"])
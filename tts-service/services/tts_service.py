@@ -1,100 +1,116 @@
 import os
-import tempfile
-import subprocess
-import ffmpeg
+import threading
+import logging
 
 from google.cloud import texttospeech
 
-
-def generate_tts(voice: str, text: str, speaker: str, audio_config):
-  tts_filename = "tts_output.wav"
-  tts_dir = tempfile.gettempdir()
-  tts_original_filepath = os.path.join(tts_dir, tts_filename)
-
-  if voice == "google":
-    google_tts(text, speaker, tts_original_filepath)
-  # elif voice == "hong":
-  #   melo_tts(text, tts_original_filepath)
-  else:
-    print('not supported voice')
-
-  tts_converted_filepath = os.path.join(os.path.dirname(tts_original_filepath),
-                                        'tts_output_converted.mp3')
-
-  convert_audio(tts_original_filepath, tts_converted_filepath)
-
-  print(f'path: {tts_converted_filepath}')
-
-  return tts_converted_filepath
-
-
-def google_tts(text: str, speaker: str, save_to: str):
-  client = texttospeech.TextToSpeechClient()
+from services import audio_engine
+from services.audio_info import audio_duration
+from services.melo_backend import melo_backend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = int(os.getenv('TTS_SAMPLE_RATE', 16000))
+DEFAULT_OUTPUT_FORMAT = os.getenv('TTS_OUTPUT_FORMAT', 'mp3')
+
+OUTPUT_FORMATS = {
+    'mp3': {
+        'encoding': texttospeech.AudioEncoding.MP3,
+        'extension': 'mp3',
+        'content_type': 'audio/mpeg',
+        'ffmpeg_args': ["-q:a", "2", "-f", "mp3"],
+    },
+    'ogg': {
+        'encoding': texttospeech.AudioEncoding.OGG_OPUS,
+        'extension': 'ogg',
+        'content_type': 'audio/ogg',
+        'ffmpeg_args': ["-c:a", "libopus", "-f", "ogg"],
+    },
+    'wav': {
+        'encoding': texttospeech.AudioEncoding.LINEAR16,
+        'extension': 'wav',
+        'content_type': 'audio/wav',
+        'ffmpeg_args': ["-c:a", "pcm_s16le", "-f", "wav"],
+    },
+}
+
+POST_PROCESSING_KEYS = ("pitch", "bass", "treble", "reverb", "background")
+
+VOICES = ("google", "melo")
+
+_tts_client = None
+_tts_client_lock = threading.Lock()
+
+
+def get_tts_client():
+  """TextToSpeechClient is thread-safe; share one channel per process."""
+  global _tts_client
+  if _tts_client is None:
+    with _tts_client_lock:
+      if _tts_client is None:
+        _tts_client = texttospeech.TextToSpeechClient()
+  return _tts_client
+
+
+def needs_post_processing(audio_config):
+  return any(audio_config.get(k) for k in POST_PROCESSING_KEYS)
+
+
+def generate_tts(voice: str,
+                 text: str,
+                 speaker: str,
+                 audio_config,
+                 output_format: str = DEFAULT_OUTPUT_FORMAT):
+  """Render text to audio in `output_format` entirely in memory.
+
+  Returns (audio bytes, duration in seconds).
+
+  Without effects the provider is asked for the final encoding, sample rate
+  and channel layout directly, so no transcode process is spawned. With
+  effects or a background bed, the provider returns WAV and audio_engine
+  applies everything and encodes in a single ffmpeg pass. The voice never
+  touches disk, so concurrent requests cannot clobber each other.
+  """
+  if voice == "melo":
+    # Local synthesis produces WAV at the model's own rate; always encode.
+    wav = melo_backend.synthesize(text, speaker)
+    return audio_engine.render(wav, audio_config, SAMPLE_RATE,
+                               OUTPUT_FORMATS[output_format]['ffmpeg_args'])
+
+  if voice != "google":
+    logger.error(f"Not supported voice: {voice}")
+    return None, None
+
+  if not needs_post_processing(audio_config):
+    audio = google_tts(text, speaker,
+                       OUTPUT_FORMATS[output_format]['encoding'])
+    return audio, audio_duration(audio, output_format)
+
+  wav = google_tts(text, speaker, texttospeech.AudioEncoding.LINEAR16)
+  return audio_engine.render(wav, audio_config, SAMPLE_RATE,
+                             OUTPUT_FORMATS[output_format]['ffmpeg_args'])
+
+
+def google_tts(text: str, speaker: str, encoding):
+  client = get_tts_client()
   synthesis_input = texttospeech.SynthesisInput(text=text)
   voice = texttospeech.VoiceSelectionParams(language_code="ko-KR",
                                             name=speaker)
-  audio_config = texttospeech.AudioConfig(
-      audio_encoding=texttospeech.AudioEncoding.MP3)
+  # Chirp/WaveNet voices are always rendered mono.
+  audio_config = texttospeech.AudioConfig(audio_encoding=encoding,
+                                          sample_rate_hertz=SAMPLE_RATE)
 
   response = client.synthesize_speech(input=synthesis_input,
                                       voice=voice,
                                       audio_config=audio_config)
 
-  with open(save_to, "wb") as out:
-    out.write(response.audio_content)
-
-
-# def melo_tts(text: str, save_to: str):
-#   lang = 'KR'
-#   device = 'cpu'
-#
-#   homeDir = Path.home()
-#   config_path = os.path.join(homeDir, "config.json")
-#   ckpt_path = os.path.join(homeDir, "G.pth")
-#
-#   # load TTS model
-#   model = TTS(language=lang,
-#               config_path=config_path,
-#               ckpt_path=ckpt_path,
-#               device=device)
-#
-#   for spk_name, spk_id in model.hps.data.spk2id.items():
-#     os.makedirs(os.path.dirname(save_to), exist_ok=True)
-#     model.tts_to_file(text, spk_id, save_to)
-#
-#   del model
-
-
-def convert_audio(input_file: str, output_file: str):
-  cmd = [
-      "ffmpeg", "-i", input_file, "-ar", "16000", "-ac", "1", "-y", "-q:a",
-      "2", output_file
-  ]
-  subprocess.run(cmd, check=True)
-
-
-def deep_smooth_voice(input_file: str, output_file: str, pitch: int, bass: int,
-                      treble: int, reverb: int):
-
-  cmd = [
-      "sox", input_file, output_file, "pitch",
-      str(pitch), "bass",
-      str(bass), "treble",
-      str(treble), "vol", "1.2", "reverb",
-      str(reverb)
-  ]
-  subprocess.run(cmd, check=True)
-
-
-def get_audio_duration(file_path):
-  probe = ffmpeg.probe(file_path)
-  duration = float(probe['format']['duration'])
-  return duration
-
-
-def get_available_speakers():
-  client = texttospeech.TextToSpeechClient()
-  voices = client.list_voices(language_code='ko-KR')
+  return response.audio_content
+
+
+def get_available_speakers(language_code: str = None):
+  client = get_tts_client()
+  voices = client.list_voices(language_code=language_code)
 
   speakers = []
   for voice in voices.voices:
@@ -102,35 +118,10 @@ def get_available_speakers():
         'name':
         voice.name,
         'gender':
-        texttospeech.SsmlVoiceGender(voice.ssml_gender).name
+        texttospeech.SsmlVoiceGender(voice.ssml_gender).name,
+        'languageCodes':
+        list(voice.language_codes)
     })
 
   return speakers
 
-
-def mix_audio(background_path,
-              voice_path,
-              output_path,
-              bg_volume=0.5,
-              bg_start=10):
-  voice_duration = get_audio_duration(voice_path)
-
-  background = (ffmpeg.input(background_path).filter(
-      "atrim",
-      start=bg_start).filter("asetpts",
-                             "PTS-STARTPTS").filter("volume", bg_volume))
-
-  voice = ffmpeg.input(voice_path)
-
-  background = background.filter("atrim", end=voice_duration)
-
-  mixed = ffmpeg.filter([voice, background],
-                        "amix",
-                        inputs=2,
-                        duration="longest")
-  output = ffmpeg.output(mixed, output_path, format="mp3")
-
-  ffmpeg.run(output, overwrite_output=True)
-
-
-#mix_audio()
@@ -0,0 +1,66 @@
+import io
+import struct
+import wave
+
+import pytest
+
+from services.audio_info import (audio_duration, mp3_duration,
+                                 ogg_opus_duration, wav_duration,
+                                 wav_sample_rate)
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 bytes, 1152 samples.
+MP3_FRAME = struct.pack('>I', 0xFFFB9000) + bytes(413)
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def make_wav(frames: int, rate: int = 24000):
+  buffer = io.BytesIO()
+  with wave.open(buffer, 'wb') as w:
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(rate)
+    w.writeframes(bytes(frames * 2))
+  return buffer.getvalue()
+
+
+def ogg_page(granule: int, payload: bytes = b''):
+  return b'OggS' + bytes(2) + struct.pack('<q', granule) + bytes(12) + payload
+
+
+def opus_head(pre_skip: int):
+  return b'OpusHead' + bytes([1, 1]) + struct.pack('<H', pre_skip) + bytes(7)
+
+
+def test_wav_duration_and_rate():
+  data = make_wav(36000, rate=24000)
+  assert wav_duration(data) == pytest.approx(1.5)
+  assert wav_sample_rate(data) == 24000
+
+
+def test_mp3_duration_counts_frames():
+  assert mp3_duration(MP3_FRAME * 10) == pytest.approx(10 * MP3_FRAME_SECONDS)
+
+
+def test_mp3_duration_skips_id3_tag():
+  tag = b'ID3' + bytes([4, 0, 0]) + bytes([0, 0, 1, 0]) + bytes(128)
+  assert mp3_duration(tag + MP3_FRAME * 3) == pytest.approx(
+      3 * MP3_FRAME_SECONDS)
+
+
+def test_mp3_duration_resyncs_after_garbage():
+  data = b'\x00\x01\x02' + MP3_FRAME * 2
+  assert mp3_duration(data) == pytest.approx(2 * MP3_FRAME_SECONDS)
+
+
+def test_ogg_opus_duration_subtracts_pre_skip():
+  data = ogg_page(0, opus_head(312)) + ogg_page(0) + ogg_page(96312)
+  assert ogg_opus_duration(data) == pytest.approx(2.0)
+
+
+def test_ogg_opus_duration_without_pages():
+  assert ogg_opus_duration(b'not ogg') == 0.0
+
+
+def test_audio_duration_dispatches_on_format():
+  assert audio_duration(make_wav(24000), 'wav') == pytest.approx(1.0)
+  assert audio_duration(MP3_FRAME, 'mp3') == pytest.approx(MP3_FRAME_SECONDS)
@@ -0,0 +1,31 @@
+from services.cache_service import make_cache_key, normalize_text
+
+
+def test_normalize_text_collapses_whitespace():
+  assert normalize_text('  안녕하세요\n\t여러분  ') == '안녕하세요 여러분'
+
+
+def test_normalize_text_composes_unicode():
+  decomposed = '\u1100\u1161'  # HANGUL CHOSEONG KIYEOK + JUNGSEONG A
+  assert normalize_text(decomposed) == '\uac00'  # HANGUL SYLLABLE GA
+
+
+def test_trivially_different_text_shares_a_key():
+  assert make_cache_key('hello  world', 'A', 'ko-KR', None) == make_cache_key(
+      ' hello world ', 'A', 'ko-KR', {})
+
+
+def test_every_render_setting_is_part_of_the_key():
+  base = make_cache_key('hello', 'A', 'ko-KR', {'pitch': 0}, 'mp3', 24000)
+  assert base != make_cache_key('hello', 'B', 'ko-KR', {'pitch': 0}, 'mp3',
+                                24000)
+  assert base != make_cache_key('hello', 'A', 'en-US', {'pitch': 0}, 'mp3',
+                                24000)
+  assert base != make_cache_key('hello', 'A', 'ko-KR', {'pitch': 2}, 'mp3',
+                                24000)
+  assert base != make_cache_key('hello', 'A', 'ko-KR', {'pitch': 0}, 'ogg',
+                                24000)
+  assert base != make_cache_key('hello', 'A', 'ko-KR', {'pitch': 0}, 'mp3',
+                                48000)
+  assert base != make_cache_key('hello', 'A', 'ko-KR', {'pitch': 0}, 'mp3',
+                                24000, voice='melo')
@@ -0,0 +1,39 @@
+from services.lifecycle_service import select_evictions
+
+DAY = 86400
+NOW = 100 * DAY
+
+
+def obj(key, size, age):
+  return (key, size, NOW - age)
+
+
+def test_expired_objects_are_evicted_regardless_of_budget():
+  objects = [obj('old', 10, 40 * DAY), obj('new', 10, DAY)]
+  expired, over_budget = select_evictions(objects, NOW, 1000, 30 * DAY, DAY)
+  assert expired == [objects[0]]
+  assert over_budget == []
+
+
+def test_least_recently_used_go_first_while_over_budget():
+  objects = [
+      obj('b', 40, 3 * DAY),
+      obj('a', 40, 5 * DAY),
+      obj('c', 40, 2 * DAY),
+  ]
+  expired, over_budget = select_evictions(objects, NOW, 60, 30 * DAY, 0)
+  assert expired == []
+  assert [o[0] for o in over_budget] == ['a', 'b']
+
+
+def test_recently_used_objects_are_kept_over_budget():
+  objects = [obj('a', 40, 5 * DAY), obj('b', 40, 60), obj('c', 40, 30)]
+  _, over_budget = select_evictions(objects, NOW, 40, 30 * DAY, 3600)
+  assert [o[0] for o in over_budget] == ['a']
+
+
+def test_expired_bytes_do_not_count_against_budget():
+  objects = [obj('old', 100, 40 * DAY), obj('new', 50, 2 * DAY)]
+  expired, over_budget = select_evictions(objects, NOW, 60, 30 * DAY, 0)
+  assert [o[0] for o in expired] == ['old']
+  assert over_budget == []
@@ -1,4 +1,5 @@
 import os
+import time
 import requests
 import logging
 
@@ -7,6 +8,8 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 CHROMECAST_API_URL = os.getenv("CHROMECAST_API_URL", "http://localhost:5000")
+# Longest single status request; chromecast-service caps it at 60 seconds.
+JOB_POLL_SECONDS = 30
 
 def play_media(device_id: str, media_url: str, content_type: str = "audio/mp3"):
     """
@@ -52,3 +55,81 @@ def play_youtube_url(device_id: str, youtube_url: str, duration: int = 0):
     except Exception as e:
         logger.error(f"An unexpected error occurred in play_youtube_url: {e}")
         return None
+
+
+def queue_media(device_id: str, media_urls: list[str], content_type: str = "audio/mp3"):
+    """
+    Requests chromecast-service to append media URLs to the device's media queue.
+    """
+    try:
+        url = f"{CHROMECAST_API_URL}/v1.0/chromecast/device/queue"
+        payload = {
+            "deviceId": device_id,
+            "mediaUrls": media_urls,
+            "contentType": content_type
+        }
+        response = requests.post(url, json=payload)
+        response.raise_for_status()
+        logger.info(f"Successfully queued {len(media_urls)} media items on device {device_id}")
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to queue media items: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"An unexpected error occurred in queue_media: {e}")
+        return None
+
+
+def prepare_device(device_id: str, youtube_url: str | None = None, media_urls: list[str] | None = None):
+    """
+    Asks chromecast-service to connect to the device ahead of a scheduled
+    playback and, for YouTube, to resolve the audio stream in advance.
+    TTS clips in media_urls are pulled into its LAN media cache.
+    """
+    try:
+        url = f"{CHROMECAST_API_URL}/v1.0/chromecast/device/prepare"
+        payload = {"deviceId": device_id}
+        if youtube_url:
+            payload["youtubeUrl"] = youtube_url
+        if media_urls:
+            payload["mediaUrls"] = media_urls
+        response = requests.post(url, json=payload)
+        response.raise_for_status()
+        logger.info(f"Successfully requested warmup for device {device_id}")
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to request device warmup: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"An unexpected error occurred in prepare_device: {e}")
+        return None
+
+
+def job_id(response: dict | None) -> str | None:
+    """The chromecast-service job id in a play/queue/prepare response."""
+    return response.get("jobId") if response else None
+
+
+def wait_for_job(job_id: str, timeout: float):
+    """
+    Long-polls chromecast-service until the job has finished or failed, or
+    until timeout seconds have passed. Returns the last job record seen, or
+    None if the status could not be read.
+    """
+    deadline = time.monotonic() + timeout
+    record = None
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return record
+        try:
+            url = f"{CHROMECAST_API_URL}/v1.0/chromecast/jobs/{job_id}"
+            wait = min(remaining, JOB_POLL_SECONDS)
+            response = requests.get(url, params={"wait": wait}, timeout=wait + 5)
+            response.raise_for_status()
+            record = response.json()["data"]
+        except Exception as e:
+            logger.error(f"Failed to read status of job {job_id}: {e}")
+            return None
+        if record["status"] in ("finished", "failed"):
+            return record
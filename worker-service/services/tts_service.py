@@ -8,9 +8,10 @@ logger = logging.getLogger(__name__)
 
 TTS_API_URL = os.getenv("TTS_API_URL", "http://localhost:4002")
 
-def request_tts(text: str, language: str = "ko") -> str | None:
+def request_tts(text: str, language: str = "ko") -> dict | None:
     """
-    Requests TTS generation from the tts-service and returns a presigned URL.
+    Requests TTS generation from the tts-service and returns the clip:
+    its presignedUrl and, when known, its duration in seconds.
     """
     try:
         url = f"{TTS_API_URL}/v1.0/tts"
@@ -29,7 +30,7 @@ def request_tts(text: str, language: str = "ko") -> str | None:
             return None
         
         logger.info(f"Received presigned URL from tts-service.")
-        return presigned_url
+        return {"presignedUrl": presigned_url, "duration": data.get("duration")}
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to request TTS from {TTS_API_URL}: {e}")
@@ -37,3 +38,35 @@ def request_tts(text: str, language: str = "ko") -> str | None:
     except Exception as e:
         logger.error(f"An unexpected error occurred in request_tts: {e}")
         return None
+
+
+def request_tts_batch(texts: list[str], language: str = "ko") -> list[dict | None]:
+    """
+    Requests TTS generation for many texts in one call.
+    Returns clips like request_tts in input order, None for items that failed.
+    """
+    try:
+        url = f"{TTS_API_URL}/v1.0/tts/batch"
+        payload = {
+            "items": [{"text": text, "language": language} for text in texts],
+        }
+        response = requests.post(url, json=payload)
+        response.raise_for_status()
+
+        results = response.json().get("data", [])
+        clips = []
+        for result in results:
+            if result.get("status") != "success":
+                logger.error(f"TTS batch item failed: {result.get('message')}")
+                clips.append(None)
+            else:
+                clips.append({"presignedUrl": result.get("presignedUrl"),
+                              "duration": result.get("duration")})
+        return clips
+
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to request TTS batch from {TTS_API_URL}: {e}")
+        return [None] * len(texts)
+    except Exception as e:
+        logger.error(f"An unexpected error occurred in request_tts_batch: {e}")
+        return [None] * len(texts)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import modules the way worker.py does, from the service root.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from util.schedule_time import fire_times_within, next_fire_time, to_cron
+
+TZ = "Asia/Seoul"
+SEOUL = pytz.timezone(TZ)
+
+
+def seoul(*args):
+    return SEOUL.localize(datetime(*args))
+
+
+def test_recurring_maps_korean_day_names():
+    config = {"type": "RECURRING", "time": "07:30", "days": ["월", "금", "일"]}
+    assert to_cron(config) == "30 7 * * 1,5,0"
+
+
+def test_recurring_ignores_seconds():
+    assert to_cron({"type": "RECURRING", "time": "18:05:00", "days": ["토"]}) == "5 18 * * 6"
+
+
+def test_hourly_uses_the_minute_only():
+    assert to_cron({"type": "HOURLY", "time": "00:15"}) == "15 * * * *"
+
+
+def test_other_types_have_no_cron():
+    assert to_cron({"type": "ONE_TIME", "datetime": "2024-01-01T09:00:00"}) is None
+    assert to_cron({}) is None
+
+
+def test_next_fire_time_of_recurring_schedule():
+    # 2024-01-01 is a Monday.
+    config = {"type": "RECURRING", "time": "07:30", "days": ["월", "수"]}
+    assert next_fire_time(config, seoul(2024, 1, 1, 7, 0), TZ) == seoul(2024, 1, 1, 7, 30)
+    assert next_fire_time(config, seoul(2024, 1, 1, 7, 30), TZ) == seoul(2024, 1, 3, 7, 30)
+
+
+def test_next_fire_time_of_one_time_schedule():
+    config = {"type": "ONE_TIME", "datetime": "2024-01-01T09:00:00"}
+    assert next_fire_time(config, seoul(2024, 1, 1, 8, 0), TZ) == seoul(2024, 1, 1, 9, 0)
+    assert next_fire_time(config, seoul(2024, 1, 1, 9, 0), TZ) is None
+
+
+def test_next_fire_time_of_malformed_schedule():
+    assert next_fire_time({"type": "HOURLY", "time": "at:half"}, seoul(2024, 1, 1), TZ) is None
+
+
+def test_fire_times_within_horizon():
+    config = {"type": "HOURLY", "time": "00:15"}
+    times = list(fire_times_within(config, seoul(2024, 1, 1, 9, 0), timedelta(hours=3), TZ))
+    assert times == [seoul(2024, 1, 1, 9, 15), seoul(2024, 1, 1, 10, 15), seoul(2024, 1, 1, 11, 15)]
+
+
+def test_one_time_schedule_fires_once_within_horizon():
+    config = {"type": "ONE_TIME", "datetime": "2024-01-01T09:00:00"}
+    times = list(fire_times_within(config, seoul(2024, 1, 1, 8, 0), timedelta(days=1), TZ))
+    assert times == [seoul(2024, 1, 1, 9, 0)]
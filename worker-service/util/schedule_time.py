@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytz
+from croniter import croniter
+
+DAY_MAP = {"월": 1, "화": 2, "수": 3, "목": 4, "금": 5, "토": 6, "일": 0}
+
+
+def to_cron(schedule_config: dict) -> str | None:
+    """
+    Mirrors the cron patterns schedule-service registers with BullMQ.
+    """
+    schedule_type = schedule_config.get("type")
+    if schedule_type == "RECURRING":
+        hour, minute = schedule_config["time"].split(":")[:2]
+        days = ",".join(str(DAY_MAP[day]) for day in schedule_config.get("days", []))
+        return f"{int(minute)} {int(hour)} * * {days}"
+    if schedule_type == "HOURLY":
+        minute = schedule_config["time"].split(":")[1]
+        return f"{int(minute)} * * * *"
+    return None
+
+
+def parse_datetime(value: str, tz) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = tz.localize(parsed)
+    return parsed
+
+
+def next_fire_time(schedule_config: dict, now: datetime, tz_name: str) -> datetime | None:
+    """
+    Returns the next firing of a schedule strictly after now, or None if it
+    never fires again.
+    """
+    tz = pytz.timezone(tz_name)
+    try:
+        if schedule_config.get("type") == "ONE_TIME":
+            fire_at = parse_datetime(schedule_config["datetime"], tz)
+            return fire_at if fire_at > now else None
+
+        cron = to_cron(schedule_config)
+        if not cron:
+            return None
+        return croniter(cron, now.astimezone(tz)).get_next(datetime)
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+
+def fire_times_within(schedule_config: dict, now: datetime, horizon: timedelta, tz_name: str):
+    """
+    Yields every firing between now and now + horizon.
+    """
+    end = now + horizon
+    cursor = now
+    while True:
+        fire_at = next_fire_time(schedule_config, cursor, tz_name)
+        if fire_at is None or fire_at > end:
+            return
+        yield fire_at
+        if schedule_config.get("type") == "ONE_TIME":
+            return
+        cursor = fire_at
@@ -0,0 +1,23 @@
+import re
+
+# Sentence boundaries for Korean/English announcements: terminal punctuation
+# followed by whitespace, or a line break.
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?。？！])\s+|\n+')
+
+
+def split_sentences(text: str, min_chars: int = 20):
+    """
+    Splits text into sentence-sized segments for progressive synthesis.
+    Fragments shorter than min_chars are merged into the previous segment
+    so tiny pieces don't cost a provider call each.
+    """
+    segments = []
+    for part in SENTENCE_BOUNDARY.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if segments and len(part) < min_chars:
+            segments[-1] = f"{segments[-1]} {part}"
+        else:
+            segments.append(part)
+    return segments
@@ -1,11 +1,17 @@
 import time
+import json
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from celery import Celery
 from dotenv import load_dotenv
 import os
 import redis
 
 from services import tts_service, chromecast_service, schedule_service
+from util.text import split_sentences
+from util.schedule_time import fire_times_within
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +34,111 @@ celery_app = Celery(
     backend=f'redis://{os.getenv("REDIS_HOST", "localhost")}:{os.getenv("REDIS_PORT", 6379)}/0'
 )
 
+PROGRESSIVE_TTS_MIN_CHARS = int(os.getenv("PROGRESSIVE_TTS_MIN_CHARS", 200))
+
+# Used when tts-service cannot tell how long a clip is.
+TTS_DEFAULT_WAIT_SECONDS = int(os.getenv("TTS_DEFAULT_WAIT_SECONDS", 30))
+# Slack on top of the clip length for buffering and device start-up.
+TTS_PLAYBACK_MARGIN_SECONDS = float(os.getenv("TTS_PLAYBACK_MARGIN_SECONDS", 2))
+# How much longer than estimated to wait for a completion event.
+JOB_WAIT_GRACE_SECONDS = int(os.getenv("JOB_WAIT_GRACE_SECONDS", 30))
+
+# Warmup runs WARMUP_LEAD_SECONDS before each firing; the planner looks ahead
+# far enough to cover every firing until its next run.
+WARMUP_LEAD_SECONDS = int(os.getenv("WARMUP_LEAD_SECONDS", 60))
+WARMUP_PLAN_INTERVAL_SECONDS = int(os.getenv("WARMUP_PLAN_INTERVAL_SECONDS", 60))
+SCHEDULE_TIMEZONE = os.getenv("SCHEDULE_TIMEZONE", "Asia/Seoul")
+
+celery_app.conf.beat_schedule = {
+    'plan-warmups': {
+        'task': 'worker.plan_warmups',
+        'schedule': WARMUP_PLAN_INTERVAL_SECONDS,
+    },
+}
+
+
+def tts_segments(text: str) -> list[str]:
+    return split_sentences(text) if len(text) >= PROGRESSIVE_TTS_MIN_CHARS else [text]
+
+
+def prerendered_key(schedule_id: str, text: str) -> str:
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return f"warmup:tts:{schedule_id}:{digest}"
+
+
+def playback_seconds(clips: list[dict]) -> float:
+    """
+    Total length of the clips, falling back to TTS_DEFAULT_WAIT_SECONDS when
+    tts-service did not report a duration.
+    """
+    durations = [clip.get("duration") for clip in clips]
+    if any(d is None for d in durations):
+        return TTS_DEFAULT_WAIT_SECONDS
+    return sum(durations)
+
+
+def play_tts(device_id: str, text: str, prerendered: list[dict] | None = None) -> tuple[float, str | None] | None:
+    """
+    Plays text on the device and returns how many seconds of playback remain
+    together with the chromecast-service job id of the last command sent, or
+    None if nothing could be played. Long texts are rendered progressively:
+    the first sentence is cast as soon as it is ready while the remaining ones
+    are synthesized in parallel and appended to the device's media queue.
+    """
+    if prerendered:
+        started = time.monotonic()
+        job = chromecast_service.play_media(device_id, prerendered[0]["presignedUrl"], "audio/mp3")
+        if len(prerendered) > 1:
+            job = chromecast_service.queue_media(device_id, [c["presignedUrl"] for c in prerendered[1:]], "audio/mp3")
+        return started + playback_seconds(prerendered) - time.monotonic(), chromecast_service.job_id(job)
+
+    segments = tts_segments(text)
+
+    if len(segments) == 1:
+        clip = tts_service.request_tts(text)
+        if not clip:
+            return None
+        job = chromecast_service.play_media(device_id, clip["presignedUrl"], "audio/mp3")
+        return playback_seconds([clip]), chromecast_service.job_id(job)
+
+    logger.info(f"Rendering {len(segments)} segments progressively.")
+    job = None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        rest = executor.submit(tts_service.request_tts_batch, segments[1:])
+
+        started = time.monotonic()
+        first = tts_service.request_tts(segments[0])
+        if first:
+            job = chromecast_service.play_media(device_id, first["presignedUrl"], "audio/mp3")
+
+        clips = [clip for clip in rest.result() if clip]
+
+    if first:
+        clips.insert(0, first)
+    else:
+        if not clips:
+            return None
+        started = time.monotonic()
+        job = chromecast_service.play_media(device_id, clips[0]["presignedUrl"], "audio/mp3")
+    if len(clips) > 1:
+        job = chromecast_service.queue_media(device_id, [c["presignedUrl"] for c in clips[1:]], "audio/mp3")
+    return started + playback_seconds(clips) - time.monotonic(), chromecast_service.job_id(job)
+
+
+def wait_for_playback(job_id: str | None, seconds: float):
+    """
+    Waits until chromecast-service reports the job finished, or for the
+    estimated `seconds` when its status is unavailable.
+    """
+    started = time.monotonic()
+    if job_id:
+        record = chromecast_service.wait_for_job(job_id, seconds + JOB_WAIT_GRACE_SECONDS)
+        if record and record["status"] in ("finished", "failed"):
+            logger.info(f"Playback job {job_id} {record['status']} after {time.monotonic() - started:.1f}s.")
+            return
+    time.sleep(max(seconds - (time.monotonic() - started), 0))
+
+
 @celery_app.task(bind=True, name='worker.execute_schedule')
 def execute_schedule(self, schedule):
     action_config = schedule.get("action_config", {})
@@ -58,12 +169,18 @@ def execute_schedule(self, schedule):
     try:
         if action_type == "TTS":
             text = action_config.get("text")
-            media_url = tts_service.request_tts(text)
-            if media_url:
-                chromecast_service.play_media(device_id, media_url, "audio/mp3")
-                tts_wait_time = int(os.getenv("TTS_DEFAULT_WAIT_SECONDS", 30))
-                logger.info(f"Waiting {tts_wait_time} seconds for TTS to complete.")
-                time.sleep(tts_wait_time)
+            prerendered = redis_client.get(prerendered_key(schedule.get("id"), text))
+            if prerendered:
+                logger.info("Using audio pre-rendered by warmup.")
+                prerendered = json.loads(prerendered)
+            playback = play_tts(device_id, text, prerendered)
+            if playback is not None:
+                remaining, job_id = playback
+                tts_wait_time = max(remaining, 0) + TTS_PLAYBACK_MARGIN_SECONDS
+                # Keep the device locked for as long as the announcement plays.
+                redis_client.expire(lock_key, int(tts_wait_time + JOB_WAIT_GRACE_SECONDS) + 60)
+                logger.info(f"Waiting up to {tts_wait_time:.1f} seconds for TTS to complete.")
+                wait_for_playback(job_id, tts_wait_time)
             else:
                 logger.error("Failed to get media URL from tts-service")
 
@@ -71,9 +188,10 @@ def execute_schedule(self, schedule):
             url = action_config.get("url")
             duration = action_config.get("duration", 0)
             if duration > 0:
-                chromecast_service.play_youtube_url(device_id, url, duration)
-                logger.info(f"Waiting {duration} seconds for YouTube playback to complete.")
-                time.sleep(duration)
+                job = chromecast_service.play_youtube_url(device_id, url, duration)
+                redis_client.expire(lock_key, int(duration + JOB_WAIT_GRACE_SECONDS) + 60)
+                logger.info(f"Waiting up to {duration} seconds for YouTube playback to complete.")
+                wait_for_playback(chromecast_service.job_id(job), duration)
             else:
                 logger.warning("YouTube action has no duration, not waiting.")
 
@@ -87,6 +205,67 @@ def execute_schedule(self, schedule):
         logger.info(f"Releasing lock for device {device_id}")
         redis_client.delete(lock_key)
 
+@celery_app.task(name='worker.plan_warmups')
+def plan_warmups():
+    """
+    Enqueues a warmup task WARMUP_LEAD_SECONDS ahead of every firing that
+    falls before the next planning run.
+    """
+    now = datetime.now(timezone.utc)
+    horizon = timedelta(seconds=WARMUP_LEAD_SECONDS + WARMUP_PLAN_INTERVAL_SECONDS)
+
+    for schedule in schedule_service.get_all_schedules():
+        if not schedule.get("active"):
+            continue
+
+        schedule_config = schedule.get("schedule_config", {})
+        for fire_at in fire_times_within(schedule_config, now, horizon, SCHEDULE_TIMEZONE):
+            planned_key = f"warmup:planned:{schedule.get('id')}:{int(fire_at.timestamp())}"
+            if not redis_client.set(planned_key, 1, nx=True, ex=int(horizon.total_seconds()) * 2):
+                continue
+
+            warm_at = max(now, fire_at - timedelta(seconds=WARMUP_LEAD_SECONDS))
+            logger.info(f"Planning warmup for schedule {schedule.get('id')} at {warm_at.isoformat()}")
+            warmup_schedule.apply_async(args=[schedule], eta=warm_at)
+
+
+@celery_app.task(name='worker.warmup_schedule')
+def warmup_schedule(schedule):
+    """
+    Does the expensive part of a schedule ahead of time: renders its TTS audio,
+    resolves its media and connects to the device, so that execute_schedule
+    only has to issue the play command.
+    """
+    action_config = schedule.get("action_config", {})
+    action_type = action_config.get("type")
+    device_id = action_config.get("deviceId")
+    if not device_id:
+        return
+
+    logger.info(f"Warming up schedule: {schedule.get('title')}")
+    try:
+        if action_type == "TTS":
+            text = action_config.get("text")
+            segments = tts_segments(text)
+            if len(segments) == 1:
+                clips = [tts_service.request_tts(text)]
+            else:
+                clips = tts_service.request_tts_batch(segments)
+
+            if clips and all(clips):
+                redis_client.set(prerendered_key(schedule.get("id"), text), json.dumps(clips),
+                                 ex=WARMUP_LEAD_SECONDS * 2 + 60)
+                chromecast_service.prepare_device(device_id, media_urls=[c["presignedUrl"] for c in clips])
+            else:
+                chromecast_service.prepare_device(device_id)
+
+        elif action_type == "YOUTUBE":
+            chromecast_service.prepare_device(device_id, action_config.get("url"))
+
+    except Exception as e:
+        logger.error(f"Failed to warm up schedule {schedule.get('id')}: {e}")
+
+
 @celery_app.task(name='worker.delete_schedule')
 def delete_schedule(schedule_id):
     # This is a placeholder for any cleanup needed when a schedule is deleted.
@@ -97,4 +276,4 @@ def delete_schedule(schedule_id):
 if __name__ == "__main__":
     logger.info("Starting worker-service with Celery...")
     # To run the worker, use the command:
-    # celery -A worker.celery_app worker --loglevel=info
+    # celery -A worker.celery_app worker -B --loglevel=info